@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = "account"
+
+    def ready(self):
+        # Keep the user search index and the active-user cache in step
+        # with saves and deletes
+        from . import revocation, search  # noqa: F401
@@ -41,3 +41,18 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+
+class RevokedAccessToken(models.Model):
+    """
+    An access token revoked before it expires, by jti (see
+    account/revocation.py). Rows can go once the token has expired anyway.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='revoked_access_tokens'
+    )
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
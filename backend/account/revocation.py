@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from groot.cache import TwoTierCache
+
+from .models import RevokedAccessToken, User
+
+
+class AccessTokenRevocations(TwoTierCache):
+    """
+    Access tokens (by jti) revoked before they expire.
+
+    SimpleJWT's blacklist only covers refresh tokens. Revocations are
+    stored as ``RevokedAccessToken`` rows, so they survive a cache flush or
+    outage, and the websocket auth middleware reads them through this
+    cache: one entry per jti, so every socket a client opens with the same
+    token is answered from memory after the first lookup, and revoking
+    never rewrites another token's entry. Other workers see a revocation
+    once their local entry expires, so ``LOCAL_TTL`` is kept short.
+    """
+
+    key_prefix = "revoked_access_token"
+    LOCAL_TTL = 5
+    SHARED_TTL = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+    def _load(self, jti):
+        return RevokedAccessToken.objects.filter(
+            jti=jti, expires_at__gt=datetime.now(timezone.utc)
+        ).exists()
+
+    def revoke(self, token):
+        now = datetime.now(timezone.utc)
+        jti = token[api_settings.JTI_CLAIM]
+        # Drop rows for tokens that have expired on their own
+        RevokedAccessToken.objects.filter(expires_at__lte=now).delete()
+        # A second logout with the same token is a no-op
+        RevokedAccessToken.objects.bulk_create(
+            [
+                RevokedAccessToken(
+                    jti=jti,
+                    user_id=int(token[api_settings.USER_ID_CLAIM]),
+                    expires_at=datetime.fromtimestamp(token["exp"], timezone.utc),
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        self.set(jti, True)
+
+    async def is_revoked(self, token):
+        jti = token.get(api_settings.JTI_CLAIM)
+        return jti is not None and await self.aget(jti)
+
+
+class ActiveUsers(TwoTierCache):
+    """
+    Whether a user id belongs to an active account.
+
+    Checked on every websocket handshake, including those authenticated
+    from token claims alone, so deactivating an account cuts off new
+    sockets without waiting for its tokens to expire. Saving or deleting a
+    user invalidates the entry; other workers follow within ``LOCAL_TTL``.
+    """
+
+    key_prefix = "user_active"
+    LOCAL_TTL = 5
+
+    def _load(self, user_id):
+        return User.objects.filter(id=user_id, is_active=True).exists()
+
+
+# Global instances
+access_token_revocations = AccessTokenRevocations()
+active_users = ActiveUsers()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_active_user(sender, instance, **kwargs):
+    active_users.invalidate([instance.id])
@@ -0,0 +1,174 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FIELDS = ("id", "username", "email", "date_joined", "last_login")
+PART_RE = re.compile(r"[^\W_]+")
+
+
+def search_keys(username, email):
+    """Normalized keys a user can be found by: the full values and their parts."""
+    keys = set()
+    for value in (username, email):
+        if value:
+            value = value.casefold()
+            keys.add(value)
+            keys.update(PART_RE.findall(value))
+    return keys
+
+
+class UserPrefixIndex:
+    """
+    In-memory prefix index over normalized usernames and emails.
+
+    Keys are kept in a sorted list of ``(key, user_id)``, so a lookup is a
+    binary search plus a short scan, with no database query: the columns
+    ``UserSerializer`` needs are kept alongside. Users can be found by a
+    prefix of their username, their email or any word in either, so "doe"
+    finds "john.doe@example.com".
+
+    Saves and deletes in this process update the index in place; changes
+    made by other workers show up after the periodic rebuild (``MAX_AGE``).
+    Only the first search waits for a build. Once the index is stale, one
+    background thread rebuilds it while searches keep using the old one,
+    and saves or deletes made during the rebuild are replayed onto the
+    new index.
+    """
+
+    MAX_AGE = 300
+    MAX_RESULTS = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time
+        self._keys = []  # sorted (key, user_id)
+        self._rows = {}  # user_id -> tuple of FIELDS
+        self._built_at = None
+        self._replay = None  # (user_id, row or None) while rebuilding
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None:
+            # Nothing to serve yet: build once for every waiting request
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self._rebuild()
+        elif time.monotonic() - built_at > self.MAX_AGE:
+            if self._rebuild_lock.acquire(blocking=False):
+                threading.Thread(
+                    target=self._rebuild_in_background, daemon=True
+                ).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        except Exception:
+            # The old index stays; the next search past MAX_AGE retries
+            logger.exception("User search index rebuild failed")
+        finally:
+            self._rebuild_lock.release()
+            connection.close()
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Caller holds self._rebuild_lock
+        with self.lock:
+            self._replay = []
+        try:
+            rows = {row[0]: row for row in User.objects.values_list(*FIELDS)}
+            keys = sorted(
+                (key, user_id)
+                for user_id, row in rows.items()
+                for key in search_keys(row[1], row[2])
+            )
+        except BaseException:
+            with self.lock:
+                self._replay = None
+            raise
+        with self.lock:
+            replay, self._replay = self._replay, None
+            self._rows, self._keys = rows, keys
+            self._built_at = time.monotonic()
+            # Changes the snapshot may have missed
+            for user_id, row in replay:
+                self._remove(user_id)
+                if row is not None:
+                    self._insert(user_id, row)
+
+    def update(self, user):
+        row = tuple(getattr(user, field) for field in FIELDS)
+        with self.lock:
+            if self._replay is not None:
+                self._replay.append((user.id, row))
+            if self._built_at is None:
+                return
+            self._remove(user.id)
+            self._insert(user.id, row)
+
+    def remove(self, user_id):
+        with self.lock:
+            if self._replay is not None:
+                self._replay.append((user_id, None))
+            if self._built_at is not None:
+                self._remove(user_id)
+
+    def _insert(self, user_id, row):
+        self._rows[user_id] = row
+        for key in search_keys(row[1], row[2]):
+            insort(self._keys, (key, user_id))
+
+    def _remove(self, user_id):
+        row = self._rows.pop(user_id, None)
+        if row is None:
+            return
+        for key in search_keys(row[1], row[2]):
+            i = bisect_left(self._keys, (key, user_id))
+            if i < len(self._keys) and self._keys[i] == (key, user_id):
+                del self._keys[i]
+
+    def search(self, query, exclude_id=None, limit=MAX_RESULTS):
+        """Return up to ``limit`` unsaved ``User`` instances matching the prefix."""
+        query = query.strip().casefold()
+        if not query:
+            return []
+        self._ensure_fresh()
+
+        found = {}
+        with self.lock:
+            i = bisect_left(self._keys, (query,))
+            while i < len(self._keys) and len(found) < limit:
+                key, user_id = self._keys[i]
+                if not key.startswith(query):
+                    break
+                if user_id != exclude_id and user_id not in found:
+                    found[user_id] = self._rows[user_id]
+                i += 1
+        return [User(**dict(zip(FIELDS, row))) for row in found.values()]
+
+
+# Global instance
+user_search_index = UserPrefixIndex()
+
+
+@receiver(post_save, sender=User)
+def update_user_search_index(sender, instance, **kwargs):
+    user_search_index.update(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_user_search_index(sender, instance, **kwargs):
+    user_search_index.remove(instance.id)
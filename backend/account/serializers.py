@@ -79,6 +79,14 @@ class RegisterSerializer(serializers.ModelSerializer):
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Custom token serializer that uses email instead of username"""
     username_field = 'email'
+
+    @classmethod
+    def get_token(cls, user):
+        """Add profile claims so websocket auth can skip the user lookup"""
+        token = super().get_token(user)
+        token['email'] = user.email
+        token['username'] = user.username
+        return token
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1,3 +1,159 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from chat.middleware import ClaimsUser, get_user
+
+from .models import RevokedAccessToken, User
+from .revocation import access_token_revocations, active_users
+from .search import UserPrefixIndex
+from .serializers import EmailTokenObtainPairSerializer
+
+
+def _access_token(user):
+    return EmailTokenObtainPairSerializer.get_token(user).access_token
+
+
+class AccessTokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="a@example.com", username="a", password="pass"
+        )
+        # Issuing a token records its refresh token, so not from async code
+        self.token = _access_token(self.user)
+        self.other_token = _access_token(self.user)
+
+    async def test_revoked_token_only(self):
+        await sync_to_async(access_token_revocations.revoke)(self.token)
+
+        self.assertTrue(await access_token_revocations.is_revoked(self.token))
+        self.assertFalse(await access_token_revocations.is_revoked(self.other_token))
+
+    def test_revocation_survives_a_cache_flush(self):
+        access_token_revocations.revoke(self.token)
+        access_token_revocations.revoke(self.token)
+
+        cache.clear()
+        access_token_revocations.invalidate([self.token["jti"]])
+
+        self.assertEqual(RevokedAccessToken.objects.count(), 1)
+        self.assertTrue(access_token_revocations.get(self.token["jti"]))
+
+
+class WebsocketAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="a@example.com", username="a", password="pass"
+        )
+        self.token = _access_token(self.user)
+
+    async def test_claims_user(self):
+        user = await get_user(str(self.token))
+
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.id, self.user.id)
+
+    async def test_revoked_token_is_anonymous(self):
+        await sync_to_async(access_token_revocations.revoke)(self.token)
+
+        self.assertIsInstance(await get_user(str(self.token)), AnonymousUser)
+
+    async def test_deactivated_user_is_anonymous(self):
+        token = str(self.token)
+        self.assertFalse((await get_user(token)).is_anonymous)
+
+        self.user.is_active = False
+        await self.user.asave(update_fields=["is_active"])
+
+        self.assertIsInstance(await get_user(token), AnonymousUser)
+
+    async def test_deleted_user_is_anonymous(self):
+        user_id, token = self.user.id, str(self.token)
+        await self.user.adelete()
+
+        self.assertIsInstance(await get_user(token), AnonymousUser)
+        self.assertFalse(await active_users.aget(user_id))
+
+
+class UserPrefixIndexTests(TestCase):
+    def setUp(self):
+        self.john = User.objects.create_user(
+            email="john.doe@example.com", username="johnny", password="pass"
+        )
+        self.jane = User.objects.create_user(
+            email="jane@example.org", username="jdoe", password="pass"
+        )
+        self.index = UserPrefixIndex()
+
+    def _search(self, query, **kwargs):
+        return sorted(user.id for user in self.index.search(query, **kwargs))
+
+    def test_prefix_of_username_email_or_word(self):
+        self.assertEqual(self._search("joh"), [self.john.id])
+        self.assertEqual(self._search("DOE"), [self.john.id])
+        self.assertEqual(self._search("j"), [self.john.id, self.jane.id])
+        self.assertEqual(self._search("j", exclude_id=self.john.id), [self.jane.id])
+        self.assertEqual(self._search(" "), [])
+
+    def test_saves_and_deletes_update_in_place(self):
+        self.index.rebuild()
+        self.jane.username = "zelda"
+        self.index.update(self.jane)
+        self.assertEqual(self._search("zel"), [self.jane.id])
+        self.assertEqual(self._search("jdo"), [])
+
+        self.index.remove(self.jane.id)
+        self.assertEqual(self._search("zel"), [])
+
+
+class UserPrefixIndexRebuildTests(SimpleTestCase):
+    def setUp(self):
+        self.index = UserPrefixIndex()
+        self.builds = 0
+
+    def _slow_rebuild(self, started=None, release=None):
+        def rebuild():
+            self.builds += 1
+            if started is not None:
+                started.set()
+                release.wait(5)
+            else:
+                time.sleep(0.05)
+            self.index._built_at = time.monotonic()
+
+        return mock.patch.object(self.index, "_rebuild", rebuild)
+
+    def test_first_build_runs_once(self):
+        with self._slow_rebuild():
+            threads = [
+                threading.Thread(target=self.index.search, args=("a",))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.builds, 1)
+
+    def test_stale_index_keeps_serving_during_rebuild(self):
+        started, release = threading.Event(), threading.Event()
+        self.index._built_at = time.monotonic() - self.index.MAX_AGE - 1
+
+        with self._slow_rebuild(started, release):
+            self.assertEqual(self.index.search("a"), [])
+            self.assertTrue(started.wait(5))
+            # A second stale search neither waits nor starts another build
+            self.assertEqual(self.index.search("a"), [])
+            release.set()
+            with self.index._rebuild_lock:
+                pass
+
+        self.assertEqual(self.builds, 1)
@@ -1,4 +1,3 @@
-from django.db.models import Q
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -7,6 +6,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from .revocation import access_token_revocations
+from .search import user_search_index
 from .serializers import (
     RegisterSerializer,
     EmailTokenObtainPairSerializer,
@@ -32,7 +33,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = EmailTokenObtainPairSerializer.get_token(user)
         
         # Serialize user data
         user_data = UserSerializer(user).data
@@ -139,6 +140,10 @@ class LogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+            # The access token stays valid until it expires; stop it from
+            # opening new websockets
+            if request.auth is not None:
+                access_token_revocations.revoke(request.auth)
             return Response({
                 'message': 'Successfully logged out'
             }, status=status.HTTP_200_OK)
@@ -150,16 +155,15 @@ class LogoutView(APIView):
 
 class UserSearchView(generics.ListAPIView):
     """
-    Search for users to start a chat with.
+    Search for users to start a chat with, by prefix of their username,
+    email or any word in either (see account/search.py).
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        query = self.request.query_params.get('search', '')
-        if not query:
-            return User.objects.none()
-        
-        return User.objects.filter(
-            Q(username__icontains=query) | Q(email__icontains=query)
-        ).exclude(id=self.request.user.id)[:10]
+    def list(self, request, *args, **kwargs):
+        # Prefix lookup in memory; no database query per keystroke
+        users = user_search_index.search(
+            request.query_params.get('search', ''), exclude_id=request.user.id
+        )
+        return Response(self.get_serializer(users, many=True).data)
@@ -0,0 +1,41 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # Clients fall back to JSON
+    msgpack = None
+
+MSGPACK = "msgpack"
+JSON = "json"
+
+
+class FrameCodecMixin:
+    """
+    Picks the websocket frame encoding from the subprotocols the client
+    offers: binary MessagePack frames for ``msgpack``, text JSON otherwise.
+    Clients that offer no subprotocol get JSON, as before. Incoming frames
+    are decoded by their type, so either encoding is accepted.
+    """
+
+    frame_format = JSON
+
+    async def accept(self, subprotocol=None, headers=None):
+        offered = self.scope.get("subprotocols", [])
+        if msgpack is not None and MSGPACK in offered:
+            self.frame_format = subprotocol = MSGPACK
+        elif JSON in offered:
+            subprotocol = JSON
+        await super().accept(subprotocol=subprotocol, headers=headers)
+
+    async def send_frame(self, payload):
+        if self.frame_format == MSGPACK:
+            await self.send(bytes_data=msgpack.packb(payload))
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            if msgpack is None:
+                raise ValueError("MessagePack frames are not supported")
+            return msgpack.unpackb(bytes_data)
+        return json.loads(text_data)
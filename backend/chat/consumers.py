@@ -1,13 +1,198 @@
-import json
+import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Room, Message
+from .codec import FrameCodecMixin
+from .fanout import notify_users
+from .membership import room_members, room_participants
+from .models import Message
+from .persistence import message_writer
+from .presence import PresenceMixin, presence_service
+from .search import search_index
+from .typing import typing_throttle
 
 User = get_user_model()
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class RoomActionsMixin:
+    """
+    Room frames and room group events, shared by ``ChatConsumer`` (one
+    socket per room) and ``MultiplexConsumer`` (one socket per client).
+    Subclasses implement ``send_room_frame`` to address frames to the client.
+    """
+
+    async def handle_room_frame(self, room_id, data):
+        from .kyber_service import kyber_service
+
+        msg_type = data.get("type")
+        room_group_name = f"chat_{room_id}"
+
+        if msg_type == "chat_message" or "content" in data:
+            content = data.get("content") or data.get("message")
+            if not content:
+                return
+
+            # Encrypt content before saving
+            encrypted_content = await kyber_service.aencrypt(content, room_id)
+
+            # Save message to database
+            message_obj = await self.save_message(room_id, self.user, encrypted_content)
+
+            # Send message to room group (send Encrypted content)
+            await self.channel_layer.group_send(
+                room_group_name,
+                {
+                    "type": "chat_message",
+                    "room_id": room_id,
+                    "id": message_obj.id,
+                    "content": message_obj.content,  # Encrypted
+                    "sender": {
+                        "id": self.user.id,
+                        "username": self.user.username or self.user.email.split("@")[0],
+                        "email": self.user.email,
+                    },
+                    "timestamp": message_obj.timestamp.isoformat(),
+                    "is_read": False,
+                },
+            )
+
+            # Send notification to other participants' global notify channel
+            await self.notify_participants(
+                room_id,
+                {
+                    "type": "new_message",
+                    "room_id": room_id,
+                    "message": {
+                        "id": message_obj.id,
+                        "content": content,  # Plaintext for notification
+                        "sender": self.user.username,
+                        "timestamp": message_obj.timestamp.isoformat(),
+                    },
+                },
+            )
+
+            # Index the plaintext once the broadcast and notifications are out
+            await search_index.aindex_message(message_obj.id, room_id, content)
+
+        elif msg_type == "typing":
+            # Throttled and coalesced before it reaches the room group
+            typing_throttle.update(
+                room_id,
+                self.user.id,
+                self.user.username,
+                bool(data.get("is_typing", False)),
+            )
+
+        elif msg_type == "read_receipt":
+            # Mark messages as read
+            await self.mark_messages_as_read(room_id, self.user)
+
+            await self.channel_layer.group_send(
+                room_group_name,
+                {
+                    "type": "read_receipt",
+                    "room_id": room_id,
+                    "user_id": self.user.id,
+                },
+            )
+
+            # Notify sender that their messages were read via global notify channel
+            await self.notify_participants(
+                room_id,
+                {
+                    "type": "read_receipt",
+                    "room_id": room_id,
+                    "user_id": self.user.id,
+                },
+            )
+
+    async def send_room_frame(self, room_id, payload):
+        raise NotImplementedError
+
+    # Receive message from room group
+    async def chat_message(self, event):
+        from .kyber_service import kyber_service
+
+        # Decrypt content before sending to WebSocket
+        decrypted_content = await kyber_service.adecrypt(
+            event["content"], event["room_id"]
+        )
+
+        # Send message to WebSocket
+        await self.send_room_frame(
+            event["room_id"],
+            {
+                "type": "message",
+                "id": event["id"],
+                "content": decrypted_content,
+                "sender": event["sender"],
+                "timestamp": event["timestamp"],
+                "is_read": event.get("is_read", False),
+            },
+        )
+
+    async def typing(self, event):
+        # Don't send typing notification back to the sender
+        if event["user_id"] != self.user.id:
+            await self.send_room_frame(
+                event["room_id"],
+                {
+                    "type": "typing",
+                    "user_id": event["user_id"],
+                    "username": event["username"],
+                    "is_typing": event["is_typing"],
+                },
+            )
+
+    async def read_receipt(self, event):
+        # Send read receipt to WebSocket
+        await self.send_room_frame(
+            event["room_id"],
+            {
+                "type": "read_receipt",
+                "room_id": event["room_id"],
+                "user_id": event["user_id"],
+            },
+        )
+
+    async def is_participant(self, room_id, user):
+        return await room_participants.aget((room_id, user.id))
+
+    async def save_message(self, room_id, user, content):
+        if settings.MESSAGE_WRITE_BEHIND:
+            # Returns at once with the id assigned; written in the next batch
+            return await message_writer.save(room_id, user.id, content)
+
+        # Membership was checked on join, so the room need not be fetched
+        return await Message.objects.acreate(
+            room_id=room_id, sender_id=user.id, content=content
+        )
+
+    async def mark_messages_as_read(self, room_id, user):
+        from django.utils import timezone
+
+        if settings.MESSAGE_WRITE_BEHIND:
+            # Include messages still in the write-behind buffer
+            await message_writer.wait_flushed()
+
+        return await (
+            Message.objects.filter(room_id=room_id, is_read=False)
+            .exclude(sender_id=user.id)
+            .aupdate(is_read=True, read_at=timezone.now())
+        )
+
+    async def notify_participants(self, room_id, payload):
+        participants = await room_members.aget(room_id)
+        await notify_users(
+            self.channel_layer,
+            [p_id for p_id in participants if p_id != self.user.id],
+            payload,
+        )
+
+
+class ChatConsumer(
+    FrameCodecMixin, PresenceMixin, RoomActionsMixin, AsyncWebsocketConsumer
+):
     async def connect(self):
         self.room_id = self.scope["url_route"]["kwargs"]["room_name"]
         self.room_group_name = f"chat_{self.room_id}"
@@ -26,55 +211,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
-        await self.update_user_presence(True)
-
         await self.accept()
 
-        # Notify others in all shared rooms about online status
-        contacts = await self.get_user_contacts(self.user.id)
-        for contact_id in contacts:
-            await self.channel_layer.group_send(
-                f"notify_{contact_id}",
-                {
-                    "type": "notification",
-                    "payload": {
-                        "type": "user_presence",
-                        "user_id": self.user.id,
-                        "is_online": True,
-                    },
-                },
-            )
-
-        # Notify others in CURRENT room about online status (via room group too)
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {"type": "user_presence", "user_id": self.user.id, "is_online": True},
+        await presence_service.connect(
+            self.user.id, self.channel_name, self.room_group_name
         )
 
     async def disconnect(self, close_code):
         # Leave room group
         if hasattr(self, "room_group_name"):
-            await self.update_user_presence(False)
-
-            # Notify others in all shared rooms about offline status
-            contacts = await self.get_user_contacts(self.user.id)
-            for contact_id in contacts:
-                await self.channel_layer.group_send(
-                    f"notify_{contact_id}",
-                    {
-                        "type": "notification",
-                        "payload": {
-                            "type": "user_presence",
-                            "user_id": self.user.id,
-                            "is_online": False,
-                        },
-                    },
-                )
-
-            # Notify others in CURRENT room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {"type": "user_presence", "user_id": self.user.id, "is_online": False},
+            presence_service.disconnect(self.channel_name)
+            typing_throttle.update(
+                self.room_id, self.user.id, self.user.username, False
             )
 
             await self.channel_layer.group_discard(
@@ -82,221 +230,137 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        from .kyber_service import kyber_service
+    async def receive(self, text_data=None, bytes_data=None):
+        # Any frame, including "heartbeat", keeps the connection alive
+        presence_service.touch(self.channel_name)
 
         try:
-            data = json.loads(text_data)
-            msg_type = data.get("type")
-
-            if msg_type == "chat_message" or "content" in data:
-                content = data.get("content") or data.get("message")
-                if not content:
-                    return
+            await self.handle_room_frame(
+                self.room_id, self.decode_frame(text_data, bytes_data)
+            )
+        except Exception as e:
+            print(f"WS Receive Error: {e}")
 
-                # Encrypt content before saving
-                encrypted_content = kyber_service.encrypt(content)
+    async def send_room_frame(self, room_id, payload):
+        await self.send_frame(payload)
 
-                # Save message to database
-                message_obj = await self.save_message(
-                    self.room_id, self.user, encrypted_content
-                )
+    async def user_presence(self, event):
+        # Send presence update to WebSocket
+        await self.send_frame(
+            {
+                "type": "user_presence",
+                "user_id": event["user_id"],
+                "is_online": event["is_online"],
+            }
+        )
 
-                # Send message to room group (send Encrypted content)
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "chat_message",
-                        "id": message_obj.id,
-                        "content": message_obj.content,  # Encrypted
-                        "sender": {
-                            "id": self.user.id,
-                            "username": self.user.username
-                            or self.user.email.split("@")[0],
-                            "email": self.user.email,
-                        },
-                        "timestamp": message_obj.timestamp.isoformat(),
-                        "is_read": False,
-                    },
-                )
 
-                # Send notification to other participants' global notify channel
-                participants = await self.get_room_participants(self.room_id)
-                for p_id in participants:
-                    if p_id != self.user.id:
-                        await self.channel_layer.group_send(
-                            f"notify_{p_id}",
-                            {
-                                "type": "notification",
-                                "payload": {
-                                    "type": "new_message",
-                                    "room_id": self.room_id,
-                                    "message": {
-                                        "id": message_obj.id,
-                                        "content": content,  # Plaintext for notification
-                                        "sender": self.user.username,
-                                        "timestamp": message_obj.timestamp.isoformat(),
-                                    },
-                                },
-                            },
-                        )
-
-            elif msg_type == "typing":
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "typing",
-                        "user_id": self.user.id,
-                        "username": self.user.username,
-                        "is_typing": data.get("is_typing", False),
-                    },
-                )
+class MultiplexConsumer(
+    FrameCodecMixin, PresenceMixin, RoomActionsMixin, AsyncWebsocketConsumer
+):
+    """
+    One socket per client for notifications and any number of rooms.
 
-            elif msg_type == "read_receipt":
-                # Mark messages as read
-                await self.mark_messages_as_read(self.room_id, self.user)
+    Authentication, presence and the notification group are set up once per
+    socket; rooms are joined and left with ``{"type": "subscribe",
+    "room_id": ...}`` and ``unsubscribe`` frames, and every other room frame
+    names its room the same way. Frames to the client carry a ``stream``
+    key, either ``"notifications"`` or the room id. Presence updates carry
+    none, as they concern every view of the user.
+    """
 
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "read_receipt",
-                        "room_id": self.room_id,
-                        "user_id": self.user.id,
-                    },
-                )
+    async def connect(self):
+        self.user = self.scope.get("user")
+        if not self.user or self.user.is_anonymous:
+            await self.close()
+            return
 
-                # Notify sender that their messages were read via global notify channel
-                participants = await self.get_room_participants(self.room_id)
-                for p_id in participants:
-                    if p_id != self.user.id:
-                        await self.channel_layer.group_send(
-                            f"notify_{p_id}",
-                            {
-                                "type": "notification",
-                                "payload": {
-                                    "type": "read_receipt",
-                                    "room_id": self.room_id,
-                                    "user_id": self.user.id,
-                                },
-                            },
-                        )
+        self.rooms = set()
+        self.notification_group_name = f"notify_{self.user.id}"
 
-        except Exception as e:
-            print(f"WS Receive Error: {e}")
+        await self.channel_layer.group_add(
+            self.notification_group_name, self.channel_name
+        )
 
-    # Receive message from room group
-    async def chat_message(self, event):
-        from .kyber_service import kyber_service
+        await self.accept()
 
-        # Decrypt content before sending to WebSocket
-        decrypted_content = kyber_service.decrypt(event["content"])
+        await presence_service.connect(self.user.id, self.channel_name)
 
-        # Send message to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "message",
-                    "id": event["id"],
-                    "content": decrypted_content,
-                    "sender": event["sender"],
-                    "timestamp": event["timestamp"],
-                    "is_read": event.get("is_read", False),
-                }
+    async def disconnect(self, close_code):
+        if hasattr(self, "notification_group_name"):
+            presence_service.disconnect(self.channel_name)
+            for room_id in self.rooms:
+                typing_throttle.update(room_id, self.user.id, self.user.username, False)
+
+            groups = [self.notification_group_name]
+            groups += [f"chat_{room_id}" for room_id in self.rooms]
+            await asyncio.gather(
+                *(
+                    self.channel_layer.group_discard(group, self.channel_name)
+                    for group in groups
+                )
             )
-        )
 
-    async def typing(self, event):
-        # Don't send typing notification back to the sender
-        if event["user_id"] != self.user.id:
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "typing",
-                        "user_id": event["user_id"],
-                        "username": event["username"],
-                        "is_typing": event["is_typing"],
-                    }
+    async def receive(self, text_data=None, bytes_data=None):
+        # Any frame, including "heartbeat", keeps the connection alive
+        presence_service.touch(self.channel_name)
+
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+            msg_type = data.get("type")
+            if msg_type == "heartbeat":
+                return
+
+            room_id = str(data.get("room_id", ""))
+            if not room_id.isdigit():
+                return
+
+            if msg_type == "subscribe":
+                await self.subscribe(room_id)
+            elif msg_type == "unsubscribe":
+                await self.unsubscribe(room_id)
+            elif room_id in self.rooms:
+                await self.handle_room_frame(room_id, data)
+            else:
+                await self.send_room_frame(
+                    room_id, {"type": "error", "detail": "Not subscribed"}
                 )
-            )
+        except Exception as e:
+            print(f"WS Receive Error: {e}")
 
-    async def read_receipt(self, event):
-        # Send read receipt to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "read_receipt",
-                    "room_id": event["room_id"],
-                    "user_id": event["user_id"],
-                }
-            )
-        )
+    async def subscribe(self, room_id):
+        if room_id not in self.rooms:
+            if not await self.is_participant(room_id, self.user):
+                await self.send_room_frame(
+                    room_id, {"type": "error", "detail": "Not a participant"}
+                )
+                return
+            self.rooms.add(room_id)
+            await self.channel_layer.group_add(f"chat_{room_id}", self.channel_name)
+        await self.send_room_frame(room_id, {"type": "subscribed"})
 
-    async def user_presence(self, event):
-        # Send presence update to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "user_presence",
-                    "user_id": event["user_id"],
-                    "is_online": event["is_online"],
-                }
-            )
-        )
+    async def unsubscribe(self, room_id):
+        if room_id in self.rooms:
+            self.rooms.discard(room_id)
+            typing_throttle.update(room_id, self.user.id, self.user.username, False)
+            await self.channel_layer.group_discard(f"chat_{room_id}", self.channel_name)
+        await self.send_room_frame(room_id, {"type": "unsubscribed"})
 
-    @database_sync_to_async
-    def is_participant(self, room_id, user):
-        try:
-            room = Room.objects.get(id=room_id)
-            return room.participants.filter(id=user.id).exists()
-        except Room.DoesNotExist:
-            return False
-
-    @database_sync_to_async
-    def save_message(self, room_id, user, content):
-        room = Room.objects.get(id=room_id)
-        return Message.objects.create(room=room, sender=user, content=content)
-
-    @database_sync_to_async
-    def mark_messages_as_read(self, room_id, user):
-        from django.utils import timezone
+    async def send_room_frame(self, room_id, payload):
+        await self.send_frame({**payload, "stream": room_id})
 
-        return (
-            Message.objects.filter(room_id=room_id, is_read=False)
-            .exclude(sender=user)
-            .update(is_read=True, read_at=timezone.now())
-        )
+    async def user_presence(self, event):
+        # Contacts already hear about presence on the notification group
+        pass
 
-    @database_sync_to_async
-    def get_room_participants(self, room_id):
-        try:
-            room = Room.objects.get(id=room_id)
-            return list(room.participants.values_list("id", flat=True))
-        except Room.DoesNotExist:
-            return []
-
-    @database_sync_to_async
-    def update_user_presence(self, is_online):
-        from .models import UserPresence
-
-        presence, created = UserPresence.objects.get_or_create(user=self.user)
-        presence.is_online = is_online
-        presence.save()
-        return presence
-
-    @database_sync_to_async
-    def get_user_contacts(self, user_id):
-        try:
-            # Find all users who share a room with this user
-            rooms = Room.objects.filter(participants__id=user_id)
-            contacts = (
-                User.objects.filter(chats__in=rooms).exclude(id=user_id).distinct()
-            )
-            return list(contacts.values_list("id", flat=True))
-        except:
-            return []
+    async def notification(self, event):
+        payload = event["payload"]
+        if payload.get("type") != "user_presence":
+            payload = {**payload, "stream": "notifications"}
+        await self.send_frame(payload)
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(FrameCodecMixin, PresenceMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope.get("user")
         if not self.user or self.user.is_anonymous:
@@ -312,12 +376,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
+        await presence_service.connect(self.user.id, self.channel_name)
+
     async def disconnect(self, close_code):
         if hasattr(self, "notification_group_name"):
+            presence_service.disconnect(self.channel_name)
+
             await self.channel_layer.group_discard(
                 self.notification_group_name, self.channel_name
             )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        # Only heartbeats are expected on this socket
+        presence_service.touch(self.channel_name)
+
     async def notification(self, event):
         # Send notification to WebSocket
-        await self.send(text_data=json.dumps(event["payload"]))
+        await self.send_frame(event["payload"])
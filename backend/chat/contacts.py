@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+
+from groot.cache import TwoTierCache
+
+User = get_user_model()
+
+
+class ContactCache(TwoTierCache):
+    """
+    Cache of the user ids that share at least one room with a given user.
+
+    Joining or creating a room changes the contact set of everyone in it,
+    which is why the views call ``invalidate_room`` after touching
+    ``Room.participants``.
+    """
+
+    key_prefix = "contacts_user"
+
+    def _load(self, user_id):
+        return frozenset(
+            User.objects.filter(chats__participants__id=user_id)
+            .exclude(id=user_id)
+            .values_list("id", flat=True)
+            .distinct()
+        )
+
+    def invalidate_room(self, room):
+        """Drop cached contacts for every participant of ``room``."""
+        self.invalidate(room.participants.values_list("id", flat=True))
+
+
+# Global instance
+contact_cache = ContactCache()
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on in-flight group_send calls per fan-out, so one big room
+# cannot monopolise the channel layer connection pool.
+MAX_CONCURRENT_SENDS = 64
+
+
+async def group_send_many(channel_layer, groups, message, limit=MAX_CONCURRENT_SENDS):
+    """Send ``message`` to every group concurrently, at most ``limit`` at once."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def send(group):
+        async with semaphore:
+            await channel_layer.group_send(group, message)
+
+    await asyncio.gather(*(send(group) for group in groups))
+
+
+async def notify_users(channel_layer, user_ids, payload):
+    """Deliver ``payload`` to each user's ``NotificationConsumer``."""
+    await group_send_many(
+        channel_layer,
+        [f"notify_{user_id}" for user_id in user_ids],
+        {"type": "notification", "payload": payload},
+    )
+
+
+# Tasks started by spawn(); the event loop only keeps weak references
+_background_tasks = set()
+
+
+def spawn(coro):
+    """Run ``coro`` in the background and log it if it fails."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
+
+def _task_done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task failed", exc_info=task.exception())
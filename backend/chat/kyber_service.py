@@ -5,6 +5,10 @@ import pickle
 import threading
 from pathlib import Path
 
+from django.conf import settings
+
+from .session_keys import PREFIX as SESSION_PREFIX, room_keys
+
 # Add kyber_py to sys.path
 # Assuming we are in backend/chat/ or backend/
 # kyber_py is in ../../kyber_py relative to this file
@@ -36,8 +40,12 @@ class KyberService:
         self._initialized = True
         self.lock = threading.Lock()
         self.keys_file = BASE_DIR / "backend" / "kyber_keys.pkl"
+        self.noise_pool = None
+        if settings.KYBER_NOISE_POOL:
+            self.noise_pool = kyber_funcs.NoisePool(settings.KYBER_NOISE_POOL)
+            self.noise_pool.start()
         # Instantiate Kyber with the global hw interface from kyber_funcs
-        self.kyber = kyber_funcs.Kyber(kyber_funcs.hw)
+        self.kyber = kyber_funcs.Kyber(kyber_funcs.hw, self.noise_pool)
         self._initialize_keys()
 
     def _initialize_keys(self):
@@ -62,11 +70,19 @@ class KyberService:
                     )
                 print(f"Kyber keys generated and saved to {self.keys_file}")
 
-    def encrypt(self, plaintext: str) -> str:
+    def encrypt(self, plaintext: str, room_id=None) -> str:
         """
-        Encrypts plaintext using Kyber.
-        Returns a JSON string containing the 'u' and 'v' vectors.
+        Encrypts plaintext with the room's session key (ROOM_SESSION_KEYS),
+        or else using Kyber.
+        Returns the session ciphertext, or a JSON string containing the
+        'u' and 'v' vectors.
         """
+        if room_id is not None and settings.ROOM_SESSION_KEYS:
+            try:
+                return room_keys.encrypt(room_id, plaintext)
+            except Exception as e:
+                print(f"Room key encryption error, using server key: {e}")
+
         with self.lock:
             try:
                 # self.kyber.encrypt returns (u, v) list of ints
@@ -77,14 +93,22 @@ class KyberService:
                 # Fallback to plaintext if encryption fails (for robustness)
                 return plaintext
 
-    def decrypt(self, ciphertext_json: str) -> str:
+    def decrypt(self, ciphertext_json: str, room_id=None) -> str:
         """
-        Decrypts a JSON string containing 'u' and 'v' vectors.
+        Decrypts a JSON string containing 'u' and 'v' vectors, or a session
+        ciphertext of the message's room ``room_id``.
         Returns the plaintext string.
         """
         if not ciphertext_json:
             return ""
 
+        if ciphertext_json.startswith(SESSION_PREFIX):
+            try:
+                return room_keys.decrypt(ciphertext_json, room_id)
+            except Exception as e:
+                print(f"Decryption error: {e}")
+                return "[Decryption Failed]"
+
         with self.lock:
             try:
                 # Try to parse JSON
@@ -107,6 +131,24 @@ class KyberService:
                 print(f"Decryption error: {e}")
                 return "[Decryption Failed]"
 
+    async def aencrypt(self, plaintext: str, room_id=None) -> str:
+        # Session keys avoid both the lattice math and, when cached, a thread hop
+        if room_id is not None and settings.ROOM_SESSION_KEYS:
+            try:
+                return await room_keys.aencrypt(room_id, plaintext)
+            except Exception as e:
+                print(f"Room key encryption error, using server key: {e}")
+        return self.encrypt(plaintext)
+
+    async def adecrypt(self, ciphertext: str, room_id=None) -> str:
+        if ciphertext and ciphertext.startswith(SESSION_PREFIX):
+            try:
+                return await room_keys.adecrypt(ciphertext, room_id)
+            except Exception as e:
+                print(f"Decryption error: {e}")
+                return "[Decryption Failed]"
+        return self.decrypt(ciphertext, room_id)
+
 
 # Global instance
 kyber_service = KyberService()
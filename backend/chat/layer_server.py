@@ -0,0 +1,123 @@
+"""
+Minimal Redis-protocol pub/sub server.
+
+Speaks just enough RESP2/RESP3 for
+``channels_redis.pubsub.RedisPubSubChannelLayer``: PUBLISH, SUBSCRIBE,
+UNSUBSCRIBE, PING and the HELLO/CLIENT/SELECT handshake that redis-py sends
+on connect. It lets several ASGI workers share a channel
+layer during development, and gives ``bench_channel_layer`` something to
+talk to when Redis is not installed. Use a real Redis in production.
+"""
+
+import asyncio
+
+
+def encode(value, push=False):
+    """Encode a reply; ``push`` marks RESP3 out-of-band pub/sub frames."""
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, dict):
+        items = [encode(item) for pair in value.items() for item in pair]
+        return b"%%%d\r\n" % len(value) + b"".join(items)
+    if isinstance(value, (list, tuple)):
+        prefix = b">" if push else b"*"
+        return prefix + b"%d\r\n" % len(value) + b"".join(encode(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def read_command(reader):
+    """Read one command as a list of bytes, or None at end of stream."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. "PING" typed into telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+class PubSubServer:
+    def __init__(self):
+        self.subscribers = {}  # channel -> {StreamWriter: speaks RESP3}
+
+    def _drop(self, channel, writer):
+        receivers = self.subscribers.get(channel)
+        if receivers is not None:
+            receivers.pop(writer, None)
+            if not receivers:
+                del self.subscribers[channel]
+
+    async def handle(self, reader, writer):
+        subscriptions = set()
+        resp3 = False
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name, args = command[0].upper(), command[1:]
+
+                if name == b"PUBLISH":
+                    channel, data = args
+                    receivers = self.subscribers.get(channel, {})
+                    for receiver, push in receivers.items():
+                        receiver.write(encode([b"message", channel, data], push))
+                    writer.write(encode(len(receivers)))
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.subscribers.setdefault(channel, {})[writer] = resp3
+                        subscriptions.add(channel)
+                        writer.write(
+                            encode([b"subscribe", channel, len(subscriptions)], resp3)
+                        )
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args or list(subscriptions):
+                        self._drop(channel, writer)
+                        subscriptions.discard(channel)
+                        writer.write(
+                            encode([b"unsubscribe", channel, len(subscriptions)], resp3)
+                        )
+                elif name == b"HELLO":
+                    resp3 = bool(args) and args[0] == b"3"
+                    info = {b"server": b"redis", b"version": b"7.0.0"}
+                    info[b"proto"] = 3 if resp3 else 2
+                    if resp3:
+                        writer.write(encode(info))
+                    else:
+                        writer.write(encode([v for pair in info.items() for v in pair]))
+                elif name == b"PING":
+                    # RESP2 subscribed connections get the pub/sub form of the reply
+                    if subscriptions and not resp3:
+                        writer.write(encode([b"pong", args[0] if args else b""]))
+                    else:
+                        writer.write(b"+PONG\r\n")
+                elif name in (b"CLIENT", b"SELECT", b"AUTH"):
+                    writer.write(b"+OK\r\n")
+                elif name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._drop(channel, writer)
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=6379, ready=None):
+    server = await asyncio.start_server(PubSubServer().handle, host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,118 @@
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.layer_server import serve
+
+GROUP = "bench"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _run_server(port, ready):
+    asyncio.run(serve("127.0.0.1", port, ready))
+
+
+def _run_worker(url, count, ready, results):
+    # One process per simulated ASGI worker, each with its own connection
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+
+    async def main():
+        layer = RedisPubSubChannelLayer(hosts=[url])
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.set()
+
+        latencies = []
+        for _ in range(count):
+            message = await asyncio.wait_for(layer.receive(channel), timeout=30)
+            latencies.append(time.time() - message["sent"])
+        results.put((time.time(), latencies))
+        await layer.flush()
+
+    asyncio.run(main())
+
+
+async def _broadcast(url, count):
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+
+    layer = RedisPubSubChannelLayer(hosts=[url])
+    for i in range(count):
+        await layer.group_send(GROUP, {"type": "bench", "seq": i, "sent": time.time()})
+    await layer.flush()
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = (
+        "Measure channel-layer broadcast latency and throughput with 1, 2, 4 "
+        "and 8 worker processes subscribed to one group."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="Redis URL to benchmark; defaults to a local run_layer_server",
+        )
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--workers", default="1,2,4,8")
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context("spawn")
+        server = None
+        url = options["url"]
+        if not url:
+            port = _free_port()
+            ready = ctx.Event()
+            server = ctx.Process(target=_run_server, args=(port, ready), daemon=True)
+            server.start()
+            ready.wait(10)
+            url = f"redis://127.0.0.1:{port}"
+
+        count = options["messages"]
+        self.stdout.write(f"Broadcasting {count} messages via {url}")
+        self.stdout.write(
+            f"{'workers':>8} {'deliveries/s':>14} {'p50 ms':>9} {'p99 ms':>9}"
+        )
+        try:
+            for workers in [int(n) for n in options["workers"].split(",")]:
+                self._bench(ctx, url, workers, count)
+        finally:
+            if server is not None:
+                server.terminate()
+
+    def _bench(self, ctx, url, workers, count):
+        results = ctx.Queue()
+        procs = []
+        for _ in range(workers):
+            ready = ctx.Event()
+            proc = ctx.Process(target=_run_worker, args=(url, count, ready, results))
+            proc.start()
+            ready.wait(30)
+            procs.append(proc)
+
+        start = time.time()
+        asyncio.run(_broadcast(url, count))
+
+        finished, latencies = [], []
+        for _ in procs:
+            finished_at, worker_latencies = results.get(timeout=60)
+            finished.append(finished_at)
+            latencies.extend(worker_latencies)
+        for proc in procs:
+            proc.join()
+
+        elapsed = max(finished) - start
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{workers:>8} {len(latencies) / elapsed:>14.0f} "
+            f"{percentiles[49] * 1000:>9.2f} {percentiles[98] * 1000:>9.2f}"
+        )
@@ -0,0 +1,89 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.consumers import RoomActionsMixin
+from chat.models import Message, Room
+
+User = get_user_model()
+
+
+# Per-message database work as ChatConsumer did it before the async ORM:
+# one thread-pool hop per helper, plus a Room lookup before the insert.
+@database_sync_to_async
+def save_message_sync(room_id, user, content):
+    room = Room.objects.get(id=room_id)
+    return Message.objects.create(room=room, sender_id=user.id, content=content)
+
+
+@database_sync_to_async
+def mark_messages_as_read_sync(room_id, user):
+    return (
+        Message.objects.filter(room_id=room_id, is_read=False)
+        .exclude(sender_id=user.id)
+        .update(is_read=True, read_at=timezone.now())
+    )
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = (
+        "Measure per-message database latency of the chat consumer: "
+        "database_sync_to_async helpers versus the native async ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        sender = User.objects.create_user(
+            email=f"bench-{suffix}-a@example.com", username=f"bench-{suffix}-a"
+        )
+        reader = User.objects.create_user(
+            email=f"bench-{suffix}-b@example.com", username=f"bench-{suffix}-b"
+        )
+        room = Room.objects.create(name=f"bench-{suffix}")
+        room.participants.add(sender, reader)
+
+        try:
+            asyncio.run(self._bench(room.id, sender, reader, options["messages"]))
+        finally:
+            # Messages go with the room
+            room.delete()
+            User.objects.filter(id__in=[sender.id, reader.id]).delete()
+
+    async def _bench(self, room_id, sender, reader, count):
+        consumer = RoomActionsMixin()
+
+        async def before():
+            await save_message_sync(room_id, sender, "x" * 64)
+            await mark_messages_as_read_sync(room_id, reader)
+
+        async def after():
+            await consumer.save_message(room_id, sender, "x" * 64)
+            await consumer.mark_messages_as_read(room_id, reader)
+
+        self.stdout.write(f"{count} messages (save + mark read), latency in ms")
+        self.stdout.write(f"{'path':>10} {'mean':>8} {'p50':>8} {'p99':>8}")
+        for name, step in (("sync", before), ("async", after)):
+            # Warm up connections and the thread pool
+            for _ in range(20):
+                await step()
+
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                await step()
+                latencies.append(time.perf_counter() - start)
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{name:>10} {statistics.mean(latencies) * 1000:>8.3f} "
+                f"{percentiles[49] * 1000:>8.3f} {percentiles[98] * 1000:>8.3f}"
+            )
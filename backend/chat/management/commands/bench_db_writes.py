@@ -0,0 +1,116 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+def _profiles(directory):
+    return {
+        "bench_default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(Path(directory) / "default.sqlite3"),
+        },
+        "bench_tuned": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(Path(directory) / "tuned.sqlite3"),
+            "OPTIONS": settings.SQLITE_OPTIONS,
+        },
+    }
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = (
+        "Load-test concurrent SQLite writes with Django's default connection "
+        "settings and with settings.SQLITE_OPTIONS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            # Register temporary aliases so transaction.atomic(using=...)
+            # finds them, starting from the configured defaults
+            profiles = _profiles(directory)
+            for alias, profile in profiles.items():
+                connections.settings[alias] = {
+                    **connections.settings[DEFAULT_DB_ALIAS],
+                    "OPTIONS": {},
+                    "CONN_MAX_AGE": 0,
+                    **profile,
+                }
+            self.stdout.write(
+                f"{options['threads']} writer threads for {options['seconds']}s"
+            )
+            self.stdout.write(f"{'profile':>14} {'writes/s':>10} {'locked':>8}")
+            try:
+                for alias in profiles:
+                    self._bench(alias, options["threads"], options["seconds"])
+            finally:
+                for alias in profiles:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+    def _bench(self, alias, threads, seconds):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE bench_message "
+                "(id INTEGER PRIMARY KEY, room_id INTEGER, content TEXT)"
+            )
+
+        counts = {"writes": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def writer(worker):
+            conn = connections[alias]
+            writes = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    if writes % 4 == 0:
+                        # Read-then-write, like get_or_create in the views
+                        with transaction.atomic(using=alias):
+                            with conn.cursor() as cursor:
+                                cursor.execute(
+                                    "SELECT COUNT(*) FROM bench_message "
+                                    "WHERE room_id = %s",
+                                    [worker],
+                                )
+                                cursor.execute(
+                                    "INSERT INTO bench_message (room_id, content) "
+                                    "VALUES (%s, %s)",
+                                    [worker, "x" * 200],
+                                )
+                    else:
+                        # One autocommit insert, like Message.objects.create
+                        with conn.cursor() as cursor:
+                            cursor.execute(
+                                "INSERT INTO bench_message (room_id, content) "
+                                "VALUES (%s, %s)",
+                                [worker, "x" * 200],
+                            )
+                    writes += 1
+                except OperationalError as e:
+                    if "locked" not in str(e):
+                        raise
+                    locked += 1
+            conn.close()
+            with lock:
+                counts["writes"] += writes
+                counts["locked"] += locked
+
+        workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.stdout.write(
+            f"{alias:>14} {counts['writes'] / seconds:>10.0f} {counts['locked']:>8}"
+        )
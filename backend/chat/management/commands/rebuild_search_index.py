@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import Message, MessageSearchToken
+from chat.search import search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the message search index from decrypted message history, "
+        "e.g. after changing SEARCH_INDEX_KEY or for messages sent before "
+        "search existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--room", type=int, help="Only rebuild this room")
+
+    def handle(self, *args, **options):
+        from chat.kyber_service import kyber_service
+
+        messages = Message.objects.order_by("id")
+        if options["room"]:
+            messages = messages.filter(room_id=options["room"])
+
+        MessageSearchToken.objects.filter(message__in=messages.values("id")).delete()
+        count = 0
+        for message in messages.only("id", "room_id", "content").iterator():
+            search_index.index_message(
+                message.id,
+                message.room_id,
+                kyber_service.decrypt(message.content, message.room_id),
+            )
+            count += 1
+        self.stdout.write(f"Indexed {count} messages")
@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.models import Message, ReencryptionCheckpoint, RoomKey
+from chat.session_keys import PREFIX, room_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotate the server key that wraps room keys. Rewraps every room key "
+        "to the current server key, then re-encrypts messages still stored "
+        "under the old single Kyber key (or in plaintext) with room keys. "
+        "Works in small batches with checkpoints, so it can run while the "
+        "server is up and resume where an interrupted run stopped. Keys are "
+        "only retired after a grace period, so run it again later to retire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--new-key",
+            action="store_true",
+            help="Generate a new server key and make it current first",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Seconds to sleep between batches"
+        )
+        parser.add_argument(
+            "--retire",
+            action="store_true",
+            help="Afterwards, drop server keys no room key is wrapped with",
+        )
+        parser.add_argument(
+            "--grace",
+            type=float,
+            default=settings.SERVER_KEY_RETIRE_GRACE,
+            help="Seconds the current key must have been current before "
+            "older keys are retired",
+        )
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore saved checkpoints"
+        )
+
+    def handle(self, *args, **options):
+        keyring = room_keys.keyring
+        if options["new_key"]:
+            self.stdout.write(f"Server key {keyring.add()} is now current")
+
+        rewrapped = self._walk(
+            "rewrap_room_keys", RoomKey.objects.all(), self._rewrap, options
+        )
+        self.stdout.write(f"Rewrapped {rewrapped} room keys")
+
+        legacy = Message.objects.exclude(content__startswith=PREFIX).only(
+            "id", "room_id", "content"
+        )
+        reencrypted = self._walk("reencrypt_messages", legacy, self._reencrypt, options)
+        self.stdout.write(f"Re-encrypted {reencrypted} messages")
+
+        if options["retire"]:
+            current, _ = keyring.current()
+            for key_id in keyring.key_ids():
+                if key_id == current:
+                    continue
+                try:
+                    keyring.retire(key_id, self._in_use, options["grace"])
+                except ValueError as e:
+                    self.stdout.write(f"Kept server key {key_id}: {e}; run again later")
+                else:
+                    self.stdout.write(f"Retired server key {key_id}")
+
+    def _in_use(self, key_id):
+        return RoomKey.objects.filter(server_key_id=key_id).exists()
+
+    def _walk(self, job, queryset, process, options):
+        # Rows are updated one by one and the checkpoint saved after each
+        # batch. Redoing part of a batch after an interruption is harmless.
+        # No wrapping transaction: a room key created while re-encrypting
+        # must not be rolled back under messages already sealed with it.
+        checkpoint, _ = ReencryptionCheckpoint.objects.get_or_create(job=job)
+        if options["restart"]:
+            checkpoint.last_id = 0
+
+        done = 0
+        while True:
+            batch = list(
+                queryset.filter(id__gt=checkpoint.last_id).order_by("id")[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            done += process(batch)
+            checkpoint.last_id = batch[-1].id
+            checkpoint.save(update_fields=["last_id", "updated_at"])
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        # Finished: the next rotation walks everything again
+        checkpoint.last_id = 0
+        checkpoint.save(update_fields=["last_id", "updated_at"])
+        return done
+
+    def _rewrap(self, records):
+        return sum(room_keys.rewrap(record) for record in records)
+
+    def _reencrypt(self, messages):
+        from chat.kyber_service import kyber_service
+
+        count = 0
+        for message in messages:
+            plaintext = kyber_service.decrypt(message.content, message.room_id)
+            if plaintext == "[Decryption Failed]":
+                print(f"Skipping message {message.id}: cannot decrypt")
+                continue
+            # Only if unchanged since it was read
+            count += Message.objects.filter(
+                id=message.id, content=message.content
+            ).update(content=room_keys.encrypt(message.room_id, plaintext))
+        return count
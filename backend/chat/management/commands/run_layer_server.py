@@ -0,0 +1,26 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from chat.layer_server import serve
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = (
+        "Run a local Redis-protocol pub/sub server so several ASGI workers can "
+        "share a channel layer (set CHANNEL_LAYER_URL=redis://HOST:PORT)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=6379)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Channel layer server on redis://{options['host']}:{options['port']}"
+        )
+        try:
+            asyncio.run(serve(options["host"], options["port"]))
+        except KeyboardInterrupt:
+            pass
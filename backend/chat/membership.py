@@ -0,0 +1,66 @@
+from groot.cache import TwoTierCache
+
+from .models import Room
+
+
+class RoomMembershipCache(TwoTierCache):
+    """
+    Cache of the participant ids of each room.
+
+    Used by the consumers for notification fan-out so that every message
+    does not re-query ``Room.participants``. Views that add participants
+    must invalidate the room.
+    """
+
+    key_prefix = "room_members"
+
+    def _load(self, room_id):
+        return frozenset(
+            Room.participants.through.objects.filter(room_id=room_id).values_list(
+                "user_id", flat=True
+            )
+        )
+
+
+class ParticipantCache(TwoTierCache):
+    """
+    Cache of "is this user a participant of this room", keyed by
+    ``(room_id, user_id)``.
+
+    ``ChatConsumer.connect`` runs this check on every handshake, and the
+    client retries every few seconds while a socket is down, so both
+    positive and negative answers are cached. Negative answers are kept in
+    the shared cache only: views that add a participant overwrite it with
+    ``set``, but could not reach another worker's local tier, so a fresh
+    join never sees a stale "no".
+    """
+
+    key_prefix = "room_participant"
+
+    def _cache_key(self, key):
+        room_id, user_id = key
+        return f"{self.key_prefix}_{room_id}_{user_id}"
+
+    def get_local(self, key):
+        # A warm member set answers "yes" without a per-user entry; it may
+        # predate a join, so a miss there falls through
+        room_id, user_id = key
+        members = room_members.get_local(room_id)
+        if members is not None and user_id in members:
+            return True
+        return super().get_local(key)
+
+    def _set_local(self, cache_key, value):
+        if value:
+            super()._set_local(cache_key, value)
+
+    def _load(self, key):
+        room_id, user_id = key
+        return Room.participants.through.objects.filter(
+            room_id=room_id, user_id=user_id
+        ).exists()
+
+
+# Global instances
+room_members = RoomMembershipCache()
+room_participants = ParticipantCache()
@@ -1,21 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from urllib.parse import parse_qs
+from account.revocation import access_token_revocations, active_users
 
 User = get_user_model()
 
+
+class ClaimsUser(TokenUser):
+    """
+    User built from access token claims (see EmailTokenObtainPairSerializer).
+    Exposes ``id``, ``username`` and ``email`` like the ``User`` model, but
+    has no database row behind it, so consumers must use ``sender_id``-style
+    assignments rather than passing it as a model instance.
+    """
+
+    @cached_property
+    def id(self):
+        # SimpleJWT stores the id claim as a string
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+
+class UserRowCache:
+    """Small LRU of ``User`` rows keyed by id, with a short TTL."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._rows = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self._rows.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._rows[user_id]
+                return None
+            self._rows.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self.lock:
+            self._rows[user.id] = (time.monotonic() + self.ttl, user)
+            self._rows.move_to_end(user.id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+
+user_rows = UserRowCache()
+
+
 @database_sync_to_async
-def get_user(token_key):
+def load_user(user_id):
+    return User.objects.get(id=user_id)
+
+
+async def get_user(token_key):
     try:
         access_token = AccessToken(token_key)
-        user_id = access_token.payload['user_id']
-        return User.objects.get(id=user_id)
-    except Exception as e:
+        user_id = int(access_token[api_settings.USER_ID_CLAIM])
+    except (TokenError, KeyError, ValueError) as e:
         print(f"WS Auth Error: {e}")
         return AnonymousUser()
 
+    if await access_token_revocations.is_revoked(access_token):
+        print("WS Auth Error: token has been revoked")
+        return AnonymousUser()
+
+    # Claims alone would outlive a deactivation until the token expires
+    if not await active_users.aget(user_id):
+        print(f"WS Auth Error: user {user_id} is inactive or deleted")
+        return AnonymousUser()
+
+    # Tokens issued by the login/register views carry the profile claims
+    if settings.WS_JWT_STATELESS and "email" in access_token.payload:
+        return ClaimsUser(access_token)
+
+    user = user_rows.get(user_id)
+    if user is None:
+        try:
+            user = await load_user(user_id)
+        except User.DoesNotExist:
+            print(f"WS Auth Error: user {user_id} not found")
+            return AnonymousUser()
+        user_rows.put(user)
+    return user
+
+
 class JWTAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
@@ -33,5 +116,6 @@ class JWTAuthMiddleware:
 
         return await self.inner(scope, receive, send)
 
+
 def JWTAuthMiddlewareStack(inner):
     return JWTAuthMiddleware(inner)
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:00
+
+from django.db import migrations, models
+
+
+def backfill_dm_keys(apps, schema_editor):
+    # Key existing two-person "dm-" rooms; if earlier races created several
+    # rooms for the same pair, the oldest one becomes the canonical DM.
+    Room = apps.get_model("chat", "Room")
+    seen = set()
+    for room in Room.objects.filter(name__startswith="dm-").order_by("id"):
+        user_ids = sorted(room.participants.values_list("id", flat=True))
+        if len(user_ids) != 2:
+            continue
+        dm_key = f"{user_ids[0]}:{user_ids[1]}"
+        if dm_key in seen:
+            continue
+        seen.add(dm_key)
+        room.dm_key = dm_key
+        room.save(update_fields=["dm_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_userpresence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="dm_key",
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_dm_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0004_room_dm_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=32)),
+                (
+                    "message",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="chat.message",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("token", "message")},
+            },
+        ),
+    ]
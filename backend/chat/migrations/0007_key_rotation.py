@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0006_room_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReencryptionCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("job", models.CharField(max_length=64, unique=True)),
+                ("last_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="roomkey",
+            name="server_key_id",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -7,10 +7,17 @@ class Room(models.Model):
     name = models.CharField(max_length=255, unique=True)
     participants = models.ManyToManyField(User, related_name="chats")
     created_at = models.DateTimeField(auto_now_add=True)
+    # "<lower user id>:<higher user id>" for direct chats, NULL for group rooms
+    dm_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def make_dm_key(user_id, other_user_id):
+        low, high = sorted((int(user_id), int(other_user_id)))
+        return f"{low}:{high}"
+
 class Message(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_messages")
@@ -22,6 +29,33 @@ class Message(models.Model):
     def __str__(self):
         return f"{self.sender.email}: {self.content[:20]}"
 
+class MessageSearchToken(models.Model):
+    # Keyed hash of one word of the plaintext (see chat/search.py). No
+    # database constraint on message, so write-behind messages can be
+    # indexed before their row is written.
+    message = models.ForeignKey(
+        Message, on_delete=models.CASCADE, related_name="search_tokens", db_constraint=False
+    )
+    token = models.CharField(max_length=32)
+
+    class Meta:
+        unique_together = ("token", "message")
+
+class RoomKey(models.Model):
+    # A room's message key, ML-KEM encapsulated to the server key (see
+    # chat/session_keys.py). Messages name the key they were sealed with.
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="keys")
+    encapsulation = models.BinaryField()
+    # Id of the server key pair it is encapsulated to
+    server_key_id = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class ReencryptionCheckpoint(models.Model):
+    # Progress of a rotate_keys pass, so an interrupted run resumes
+    job = models.CharField(max_length=64, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class UserPresence(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="presence")
     last_seen = models.DateTimeField(auto_now=True)
@@ -0,0 +1,220 @@
+import asyncio
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class SnowflakeIds:
+    """
+    Time-sortable 53-bit message ids: milliseconds since ``EPOCH_MS``,
+    then a worker id and a per-millisecond sequence. 53 bits keeps the ids
+    exact in JavaScript numbers.
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+    WORKER_BITS = 4
+    SEQUENCE_BITS = 8
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id < 1 << self.WORKER_BITS:
+            raise ValueError(f"Worker id must be below {1 << self.WORKER_BITS}")
+        self.worker_id = worker_id
+        self.lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self):
+        with self.lock:
+            # Never go backwards, even if the wall clock does
+            now_ms = max(int(time.time() * 1000), self._last_ms)
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    # Sequence exhausted: wait for the next millisecond
+                    while now_ms <= self._last_ms:
+                        now_ms = int(time.time() * 1000)
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (
+                (now_ms - self.EPOCH_MS) << (self.WORKER_BITS + self.SEQUENCE_BITS)
+                | self.worker_id << self.SEQUENCE_BITS
+                | self._sequence
+            )
+
+
+class MessageWriteBehind:
+    """
+    Write-behind buffer for chat messages (``MESSAGE_WRITE_BEHIND``).
+
+    ``save`` gives the message its id and timestamp up front and returns it
+    unsaved, so the consumer can broadcast at once. A background task writes
+    the buffer with ``bulk_create`` every ``FLUSH_INTERVAL`` seconds, or as
+    soon as ``BATCH_SIZE`` messages are waiting. At most ``MAX_PENDING``
+    messages are buffered; beyond that ``save`` waits for the writer.
+
+    Failed batches are retried on the next tick. A batch that violates a
+    constraint is written row by row: a row whose id another process has
+    already taken (a misconfigured ``MESSAGE_ID_WORKER``) gets a fresh id
+    and is written under it, any other bad row is dropped, so a single row
+    cannot block the queue. Whatever is still buffered at
+    interpreter exit is written synchronously. A hard kill loses at most
+    the unwritten buffer, which is the trade-off this mode opts into.
+
+    The stored ``timestamp`` is set by ``auto_now_add`` at write time, a
+    few milliseconds after the one that was broadcast.
+    """
+
+    FLUSH_INTERVAL = 0.01
+    BATCH_SIZE = 500
+    MAX_PENDING = 5000
+    ID_RETRIES = 3
+
+    def __init__(self, ids):
+        self.ids = ids
+        self._pending = []  # Message instances waiting to be written
+        self._writing = []  # batch currently being written
+        self._enqueued = 0
+        self._written = 0  # includes dropped rows, for wait_flushed
+        self._changed = None  # asyncio.Condition on the writer's loop
+        self._batch_ready = None  # asyncio.Event
+        self._task = None
+        atexit.register(self.flush_sync)
+
+    async def save(self, room_id, sender_id, content):
+        self._ensure_running()
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._pending) < self.MAX_PENDING)
+            message = Message(
+                id=self.ids.next_id(),
+                room_id=room_id,
+                sender_id=sender_id,
+                content=content,
+                timestamp=timezone.now(),
+            )
+            self._pending.append(message)
+            self._enqueued += 1
+        if len(self._pending) >= self.BATCH_SIZE:
+            self._batch_ready.set()
+        return message
+
+    async def wait_flushed(self, timeout=5):
+        """Wait until every message saved so far has been written."""
+        if self._task is None:
+            return
+        target = self._enqueued
+        async with asyncio.timeout(timeout), self._changed:
+            await self._changed.wait_for(lambda: self._written >= target)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Condition()
+            self._batch_ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Message flush failed, retrying")
+                await asyncio.sleep(self.FLUSH_INTERVAL)
+
+    async def flush(self):
+        while self._pending:
+            batch = self._pending[: self.BATCH_SIZE]
+            del self._pending[: len(batch)]
+            self._writing = batch
+            try:
+                await self._write(batch)
+            except BaseException:
+                # Retry first, keeping the original order. Also on
+                # cancellation, so the exit flush still sees the batch.
+                self._pending[:0] = batch
+                raise
+            finally:
+                self._writing = []
+
+            async with self._changed:
+                self._written += len(batch)
+                self._changed.notify_all()
+
+    async def _write(self, batch):
+        try:
+            await Message.objects.abulk_create(batch)
+        except IntegrityError:
+            for message in batch:
+                await self._write_one(message)
+
+    async def _write_one(self, message):
+        for _ in range(self.ID_RETRIES):
+            try:
+                await Message.objects.abulk_create([message])
+                return
+            except IntegrityError as e:
+                error = e
+            existing = await Message.objects.filter(id=message.id).afirst()
+            if existing is None:
+                break
+            if (existing.room_id, existing.sender_id, existing.content) == (
+                message.room_id,
+                message.sender_id,
+                message.content,
+            ):
+                # Written by an earlier attempt of this batch
+                return
+            broadcast_id, message.id = message.id, self.ids.next_id()
+            logger.warning(
+                "Message id %s is taken by another worker, storing as %s; "
+                "check MESSAGE_ID_WORKER",
+                broadcast_id,
+                message.id,
+            )
+        logger.error("Dropping message %s: %s", message.id, error)
+
+    def flush_sync(self):
+        """Write whatever is still buffered; registered with ``atexit``."""
+        # The batch in flight may or may not have been committed
+        batch = self._writing + self._pending
+        if not batch:
+            return
+        try:
+            Message.objects.bulk_create(
+                batch, batch_size=self.BATCH_SIZE, ignore_conflicts=True
+            )
+            self._writing, self._pending = [], []
+        except Exception:
+            logger.exception(
+                "Message flush on exit failed, %d messages lost", len(batch)
+            )
+
+
+def _worker_id():
+    if settings.MESSAGE_ID_WORKER is not None:
+        return int(settings.MESSAGE_ID_WORKER)
+    if settings.MESSAGE_WRITE_BEHIND:
+        # Two workers with the same id would hand out the same message ids
+        raise ImproperlyConfigured(
+            "MESSAGE_WRITE_BEHIND needs a MESSAGE_ID_WORKER unique to each worker"
+        )
+    return 0
+
+
+# Global instances
+message_ids = SnowflakeIds(_worker_id())
+message_writer = MessageWriteBehind(message_ids)
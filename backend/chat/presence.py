@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.utils import timezone
+
+from .contacts import contact_cache
+from .fanout import group_send_many, notify_users, spawn
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceService:
+    """
+    Tracks which users are online across all of their open sockets.
+
+    Connections are reference-counted per user, so a second tab or a hop
+    between rooms does not flap the user offline and back. Each worker
+    counts its own sockets, and the shared cache counts the workers that
+    hold at least one socket of the user: only the first worker announces
+    the user online and only the last one announces them offline. Every
+    connection carries a heartbeat TTL; if the client goes quiet without
+    closing, the connection is reaped and its socket closed. Going offline
+    is debounced by ``OFFLINE_GRACE``: a reconnect to the same worker
+    inside that window produces no events and no writes. ``UserPresence``
+    rows are written in batches every ``FLUSH_INTERVAL`` seconds instead
+    of once per socket.
+
+    Workers refresh the shared counts they contribute to on every flush,
+    so a worker that dies without decrementing is only counted until its
+    entries expire after ``SHARED_TTL``. If the shared cache is down each
+    worker counts only itself.
+
+    All methods run on the ASGI event loop, so no locking is needed.
+    """
+
+    HEARTBEAT_TTL = 60
+    OFFLINE_GRACE = 5
+    FLUSH_INTERVAL = 5
+    SHARED_TTL = 60
+    key_prefix = "presence_workers"
+
+    def __init__(self):
+        self._connections = {}  # user_id -> {channel_name: (expires_at, room_group)}
+        self._owners = {}  # channel_name -> user_id
+        self._pending_offline = {}  # user_id -> asyncio.TimerHandle
+        self._dirty = {}  # user_id -> is_online, waiting for the next flush
+        self._task = None
+
+    def is_online(self, user_id):
+        return bool(self._connections.get(user_id)) or user_id in self._pending_offline
+
+    async def connect(self, user_id, channel_name, room_group=None):
+        self._ensure_running()
+        was_online = self.is_online(user_id)
+
+        pending = self._pending_offline.pop(user_id, None)
+        if pending:
+            pending.cancel()
+
+        expires_at = time.monotonic() + self.HEARTBEAT_TTL
+        self._connections.setdefault(user_id, {})[channel_name] = (
+            expires_at,
+            room_group,
+        )
+        self._owners[channel_name] = user_id
+
+        room_groups = [room_group] if room_group else []
+        if not was_online and await self._count_worker(user_id, 1) == 1:
+            # First socket of the user on any worker
+            self._dirty[user_id] = True
+            await self._announce(user_id, True, room_groups)
+        elif room_groups:
+            # Contacts already know; only tell the room that gained a socket
+            await self._announce(user_id, True, room_groups, notify_contacts=False)
+
+    def touch(self, channel_name):
+        """Refresh the heartbeat TTL of a connection."""
+        user_id = self._owners.get(channel_name)
+        connections = self._connections.get(user_id)
+        if connections and channel_name in connections:
+            _, room_group = connections[channel_name]
+            connections[channel_name] = (
+                time.monotonic() + self.HEARTBEAT_TTL,
+                room_group,
+            )
+
+    def disconnect(self, channel_name):
+        user_id = self._owners.pop(channel_name, None)
+        if user_id is None:
+            return
+
+        connections = self._connections.get(user_id, {})
+        _, room_group = connections.pop(channel_name, (None, None))
+        if connections:
+            return
+
+        # Last socket closed: announce offline only if it stays closed
+        self._connections.pop(user_id, None)
+        room_groups = [room_group] if room_group else []
+        loop = asyncio.get_running_loop()
+        self._pending_offline[user_id] = loop.call_later(
+            self.OFFLINE_GRACE, self._go_offline, user_id, room_groups
+        )
+
+    def _go_offline(self, user_id, room_groups):
+        if self._pending_offline.pop(user_id, None) is None:
+            return
+        spawn(self._leave(user_id, room_groups))
+
+    async def _leave(self, user_id, room_groups):
+        remaining = await self._count_worker(user_id, -1)
+        if remaining > 0 or self.is_online(user_id):
+            # Still connected to another worker, or back on this one
+            return
+        self._dirty[user_id] = False
+        await self._announce(user_id, False, room_groups)
+
+    def _shared_key(self, user_id):
+        return f"{self.key_prefix}_{user_id}"
+
+    async def _count_worker(self, user_id, delta):
+        """
+        Add ``delta`` to the number of workers holding a socket of the
+        user and return the new number.
+        """
+        key = self._shared_key(user_id)
+        try:
+            await cache.aadd(key, 0, timeout=self.SHARED_TTL)
+            return await cache.aincr(key, delta)
+        except Exception as e:
+            # Shared cache unavailable: this worker only knows itself
+            logger.warning("Cache unavailable, counting presence locally: %s", e)
+            return int(delta > 0)
+
+    async def _refresh_shared(self):
+        try:
+            await asyncio.gather(
+                *(
+                    cache.atouch(self._shared_key(user_id), timeout=self.SHARED_TTL)
+                    for user_id in self._connections
+                )
+            )
+        except Exception as e:
+            logger.warning("Cache unavailable, skipping presence refresh: %s", e)
+
+    async def _announce(self, user_id, is_online, room_groups, notify_contacts=True):
+        channel_layer = get_channel_layer()
+        presence = {"type": "user_presence", "user_id": user_id, "is_online": is_online}
+
+        contacts = await contact_cache.aget(user_id) if notify_contacts else ()
+        await asyncio.gather(
+            group_send_many(channel_layer, room_groups, presence),
+            notify_users(channel_layer, contacts, presence),
+        )
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self._reap()
+            await self._refresh_shared()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Presence flush failed")
+
+    async def _reap(self):
+        now = time.monotonic()
+        expired = [
+            channel_name
+            for connections in self._connections.values()
+            for channel_name, (expires_at, _) in connections.items()
+            if expires_at < now
+        ]
+        for channel_name in expired:
+            self.disconnect(channel_name)
+        # Close the sockets too (PresenceMixin), so a client that is still
+        # there reconnects and counts as online again instead of staying
+        # connected but offline
+        channel_layer = get_channel_layer()
+        await asyncio.gather(
+            *(
+                channel_layer.send(channel_name, {"type": "presence.expired"})
+                for channel_name in expired
+            ),
+            return_exceptions=True,
+        )
+
+    async def flush(self):
+        """Write all pending presence changes in one statement."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self._write(dirty)
+        except Exception:
+            # Keep newer changes, retry the rest on the next tick
+            for user_id, is_online in dirty.items():
+                self._dirty.setdefault(user_id, is_online)
+            raise
+
+    async def _write(self, dirty):
+        from .models import UserPresence
+
+        now = timezone.now()
+        await UserPresence.objects.abulk_create(
+            [
+                UserPresence(user_id=user_id, is_online=is_online, last_seen=now)
+                for user_id, is_online in dirty.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["is_online", "last_seen"],
+        )
+
+
+class PresenceMixin:
+    """For consumers registered with ``presence_service``."""
+
+    async def presence_expired(self, event):
+        # Reaped for missing heartbeats
+        await self.close()
+
+
+# Global instance
+presence_service = PresenceService()
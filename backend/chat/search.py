@@ -0,0 +1,83 @@
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import MessageSearchToken
+
+WORD_RE = re.compile(r"\w+")
+
+
+class SearchIndex:
+    """
+    Word index over message plaintext, kept as keyed hashes.
+
+    Every distinct word of a message is stored as
+    ``HMAC(SEARCH_INDEX_KEY, "<room_id>:<word>")``, so the table reveals
+    neither the words nor which rooms share them, and a query is a plain
+    index lookup on the hashed query words. Matching is on whole words,
+    case-insensitive; a message matches when it contains every word of the
+    query. Messages are indexed when they are written, since that is the
+    only time the server sees their plaintext.
+    """
+
+    MIN_WORD_LENGTH = 2
+    MAX_WORDS = 256  # per message
+    TOKEN_LENGTH = 32  # hex digits kept of the HMAC
+
+    def __init__(self, key):
+        self.key = key.encode()
+
+    def words(self, text):
+        words = {
+            word
+            for word in WORD_RE.findall(text.casefold())
+            if len(word) >= self.MIN_WORD_LENGTH
+        }
+        return sorted(words)[: self.MAX_WORDS]
+
+    def token(self, room_id, word):
+        digest = hmac.new(self.key, f"{room_id}:{word}".encode(), hashlib.sha256)
+        return digest.hexdigest()[: self.TOKEN_LENGTH]
+
+    def _tokens(self, message_id, room_id, text):
+        return [
+            MessageSearchToken(message_id=message_id, token=self.token(room_id, word))
+            for word in self.words(text)
+        ]
+
+    def index_message(self, message_id, room_id, text):
+        MessageSearchToken.objects.bulk_create(
+            self._tokens(message_id, room_id, text), ignore_conflicts=True
+        )
+
+    async def aindex_message(self, message_id, room_id, text):
+        await MessageSearchToken.objects.abulk_create(
+            self._tokens(message_id, room_id, text), ignore_conflicts=True
+        )
+
+    def search(self, room_id, query, before=None, limit=20):
+        """
+        Return ids of messages in the room matching every word of
+        ``query``, newest first, with ids below ``before`` if given.
+        """
+        tokens = {self.token(room_id, word) for word in self.words(query)}
+        if not tokens:
+            return []
+
+        matches = MessageSearchToken.objects.filter(token__in=tokens)
+        if before is not None:
+            matches = matches.filter(message_id__lt=before)
+        return list(
+            matches.values("message_id")
+            .annotate(hits=Count("token"))
+            .filter(hits=len(tokens))
+            .order_by("-message_id")
+            .values_list("message_id", flat=True)[:limit]
+        )
+
+
+# Global instance
+search_index = SearchIndex(settings.SEARCH_INDEX_KEY)
@@ -34,13 +34,16 @@ class MessageSerializer(serializers.ModelSerializer):
         # Encrypt content before saving
         content = validated_data.get("content", "")
         if content:
-            validated_data["content"] = kyber_service.encrypt(content)
+            room = validated_data.get("room")
+            validated_data["content"] = kyber_service.encrypt(
+                content, room.id if room else None
+            )
         return super().create(validated_data)
 
     def to_representation(self, instance):
         # Decrypt content when sending to client
         ret = super().to_representation(instance)
-        ret["content"] = kyber_service.decrypt(ret["content"])
+        ret["content"] = kyber_service.decrypt(ret["content"], instance.room_id)
         return ret
 
 
@@ -0,0 +1,366 @@
+import base64
+import fcntl
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from channels.db import database_sync_to_async
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+
+from .models import RoomKey
+
+# kyber_py sits next to the backend directory
+KYBER_PY_DIR = Path(__file__).resolve().parent.parent.parent / "kyber_py"
+if str(KYBER_PY_DIR) not in sys.path:
+    sys.path.append(str(KYBER_PY_DIR))
+
+from kyber_engine import engines
+
+PREFIX = "s1:"
+
+
+class ServerKeyring:
+    """
+    The server's ML-KEM key pairs that wrap room keys, by key id.
+
+    New room keys are encapsulated to the current key; older keys stay in
+    the keyring to unwrap existing ``RoomKey`` rows until ``rotate_keys``
+    has rewrapped them and the key is retired. The keyring file is
+    re-read whenever it changes on disk, or when asked for a key id it
+    does not have, so other processes pick up a rotation on their next
+    call without a restart. Changes are made under an flock, so ``add``
+    and ``retire`` from several processes do not lose each other's keys.
+    """
+
+    def __init__(self, path, kem):
+        self.path = Path(path)
+        self.kem = kem
+        self.lock = threading.Lock()
+        self._keyring = None
+        self._version = None
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            keyring = pickle.load(f)
+        if "keys" not in keyring:
+            # Single key pair from before key ids
+            keyring = {"current": 1, "keys": {1: keyring}}
+        # When each key became current; unknown for older files
+        keyring.setdefault("activated", {})
+        return keyring
+
+    def _load(self):
+        if self.path.exists():
+            return self._read()
+
+        with self._file_lock():
+            # Another process may have created it while we waited
+            if self.path.exists():
+                return self._read()
+            print("Generating room key encapsulation key pair...")
+            ek, dk = self.kem.keygen()
+            keyring = {
+                "current": 1,
+                "keys": {1: {"ek": ek, "dk": dk}},
+                "activated": {1: time.time()},
+            }
+            self._save(keyring)
+        return keyring
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialise writers across processes; readers never need it."""
+        with open(self.path.with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self, keyring):
+        # Replace atomically so readers never see a partial file. The
+        # temporary name is unique, so concurrent writers cannot interleave.
+        with tempfile.NamedTemporaryFile(
+            dir=self.path.parent, prefix=self.path.name, suffix=".tmp", delete=False
+        ) as f:
+            try:
+                pickle.dump(keyring, f)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, self.path)
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # os.replace gives the file a new inode on every save
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _refresh(self):
+        # Caller holds self.lock
+        version = self._file_version()
+        if self._keyring is None or version != self._version:
+            self._keyring = self._load()
+            self._version = self._file_version()
+        return self._keyring
+
+    def _keys(self):
+        with self.lock:
+            return self._refresh()
+
+    def current(self):
+        """Return ``(key_id, ek)`` of the key new room keys are wrapped with."""
+        keyring = self._keys()
+        key_id = keyring["current"]
+        return key_id, keyring["keys"][key_id]["ek"]
+
+    def decapsulation_key(self, key_id):
+        keys = self._keys()["keys"]
+        if key_id not in keys:
+            # Added by another process since the last read; the file
+            # version can miss a change if the inode number is reused
+            with self.lock:
+                self._keyring = None
+                keys = self._refresh()["keys"]
+        return keys[key_id]["dk"]
+
+    def key_ids(self):
+        return sorted(self._keys()["keys"])
+
+    @contextmanager
+    def _update(self):
+        # Caller holds self.lock. Re-read under the file lock, so a change
+        # another process saved meanwhile is not overwritten; an exception
+        # leaves the file alone.
+        self._refresh()
+        with self._file_lock():
+            keyring = self._read()
+            yield keyring
+            self._save(keyring)
+            self._keyring, self._version = keyring, self._file_version()
+
+    def add(self):
+        """Generate a new key pair and make it current. Returns its id."""
+        with self.lock, self._update() as keyring:
+            key_id = max(keyring["keys"]) + 1
+            ek, dk = self.kem.keygen()
+            keyring["keys"][key_id] = {"ek": ek, "dk": dk}
+            keyring["current"] = key_id
+            keyring["activated"][key_id] = time.time()
+        return key_id
+
+    def retire(self, key_id, in_use, grace):
+        """
+        Drop a key once nothing can still be wrapped with it. Raises
+        ValueError while the current key has been current for less than
+        ``grace`` seconds, since a process may be encapsulating to the old
+        key until it picks up the new one, or while ``in_use(key_id)`` is
+        true. Both are checked under the locks held for the save.
+        """
+        with self.lock, self._update() as keyring:
+            current = keyring["current"]
+            if key_id == current:
+                raise ValueError("Cannot retire the current key")
+            age = time.time() - keyring["activated"].get(current, 0)
+            if age < grace:
+                raise ValueError(
+                    f"key {current} has been current for {age:.0f}s, "
+                    f"less than the {grace}s grace period"
+                )
+            if in_use(key_id):
+                raise ValueError("room keys are still wrapped with it")
+            keyring["keys"].pop(key_id, None)
+
+
+class _RoomSession:
+    def __init__(self, key_id, aead, created_at):
+        self.key_id = key_id
+        self.aead = aead
+        self.created_at = created_at  # time.time() of the RoomKey
+        self.messages = 0
+
+    def expired(self):
+        return (
+            self.messages >= settings.ROOM_KEY_MAX_MESSAGES
+            or time.time() - self.created_at >= settings.ROOM_KEY_MAX_AGE
+        )
+
+
+class RoomSessionKeys:
+    """
+    Per-room AES-GCM message keys (``ROOM_SESSION_KEYS``).
+
+    Each room key is an ML-KEM-768 shared secret, encapsulated once to the
+    current key of the ``ServerKeyring`` in ``ROOM_KEY_FILE`` and stored as
+    a ``RoomKey`` row along with that key's id.
+    Messages then cost one AES-GCM call instead of a lattice encryption.
+    A room gets a new key after ``ROOM_KEY_MAX_MESSAGES`` messages from
+    this process or after ``ROOM_KEY_MAX_AGE`` seconds; older keys stay
+    valid for decryption.
+
+    Ciphertexts are ``"s1:<key id>:<base64 nonce + ciphertext>"``, with
+    the room and key ids as associated data. Decryption takes the room of
+    the message being read, so a message cannot be replayed into another
+    room. Unwrapped keys are kept for at most
+    ``MAX_KEYS`` keys, least recently used first out.
+    """
+
+    MAX_KEYS = 1024
+
+    def __init__(self, key_file):
+        self.kem = engines["kyber768"]
+        self.keyring = ServerKeyring(key_file, self.kem)
+        self.lock = threading.Lock()
+        self._rooms = OrderedDict()  # room_id -> _RoomSession for encryption
+        self._keys = OrderedDict()  # key_id -> (room_id, AESGCM)
+
+    def _unwrap(self, record):
+        dk = self.keyring.decapsulation_key(record.server_key_id)
+        data = bytes(record.encapsulation)
+        size = self.kem.ciphertext_size
+        secret = self.kem.decaps(dk, data[:size])
+        if len(data) == size:
+            return secret
+        # Rewrapped: the room key sealed under the new shared secret, which
+        # is used for this one message only, so a zero nonce is safe
+        return AESGCM(secret).decrypt(bytes(12), data[size:], str(record.id).encode())
+
+    def _open(self, record):
+        return AESGCM(self._unwrap(record))
+
+    def rewrap(self, record):
+        """
+        Re-encapsulate a room key to the current server key. The room key
+        itself, and so every message sealed with it, is unchanged.
+        """
+        server_key_id, ek = self.keyring.current()
+        if record.server_key_id == server_key_id:
+            return False
+        key = self._unwrap(record)
+        # Encapsulating yields a fresh secret, so wrap the room key under
+        # it rather than replacing it
+        secret, encapsulation = self.kem.encaps(ek)
+        record.encapsulation = encapsulation + AESGCM(secret).encrypt(
+            bytes(12), key, str(record.id).encode()
+        )
+        record.server_key_id = server_key_id
+        record.save(update_fields=["encapsulation", "server_key_id"])
+        return True
+
+    def _remember(self, key_id, room_id, aead, created_at):
+        with self.lock:
+            self._keys[key_id] = (room_id, aead)
+            self._keys.move_to_end(key_id)
+            while len(self._keys) > self.MAX_KEYS:
+                self._keys.popitem(last=False)
+            self._rooms[room_id] = session = _RoomSession(key_id, aead, created_at)
+            self._rooms.move_to_end(room_id)
+            while len(self._rooms) > self.MAX_KEYS:
+                self._rooms.popitem(last=False)
+        return session
+
+    def rotate(self, room_id):
+        """Encapsulate a new key for the room and use it from now on."""
+        server_key_id, ek = self.keyring.current()
+        key, encapsulation = self.kem.encaps(ek)
+        record = RoomKey.objects.create(
+            room_id=room_id, encapsulation=encapsulation, server_key_id=server_key_id
+        )
+        return self._remember(record.id, int(room_id), AESGCM(key), time.time())
+
+    def _cached_session(self, room_id):
+        with self.lock:
+            session = self._rooms.get(room_id)
+            if session is None or session.expired():
+                return None
+            self._rooms.move_to_end(room_id)
+            return session
+
+    def _session(self, room_id):
+        session = self._cached_session(room_id)
+        if session is not None:
+            return session
+
+        # Pick up the room's latest key, e.g. after a restart
+        if room_id not in self._rooms:
+            record = RoomKey.objects.filter(room_id=room_id).order_by("-id").first()
+            created_at = record and record.created_at.timestamp()
+            if record and time.time() - created_at < settings.ROOM_KEY_MAX_AGE:
+                return self._remember(
+                    record.id, room_id, self._open(record), created_at
+                )
+        return self.rotate(room_id)
+
+    def _seal(self, session, room_id, plaintext):
+        nonce = os.urandom(12)
+        aad = f"{room_id}:{session.key_id}".encode()
+        sealed = session.aead.encrypt(nonce, plaintext.encode("utf-8"), aad)
+        with self.lock:
+            session.messages += 1
+        return f"{PREFIX}{session.key_id}:{base64.b64encode(nonce + sealed).decode()}"
+
+    def encrypt(self, room_id, plaintext):
+        room_id = int(room_id)
+        return self._seal(self._session(room_id), room_id, plaintext)
+
+    async def aencrypt(self, room_id, plaintext):
+        # No thread hop while the room's key is cached
+        room_id = int(room_id)
+        session = self._cached_session(room_id)
+        if session is None:
+            return await database_sync_to_async(self.encrypt)(room_id, plaintext)
+        return self._seal(session, room_id, plaintext)
+
+    def _key(self, key_id):
+        with self.lock:
+            entry = self._keys.get(key_id)
+            if entry is not None:
+                self._keys.move_to_end(key_id)
+                return entry
+        record = RoomKey.objects.get(id=key_id)
+        aead = self._open(record)
+        with self.lock:
+            self._keys[key_id] = (record.room_id, aead)
+            while len(self._keys) > self.MAX_KEYS:
+                self._keys.popitem(last=False)
+        return record.room_id, aead
+
+    def _unseal(self, key_id, key_room_id, aead, room_id, data):
+        # The message's room, not the key's, goes into the associated data,
+        # so a ciphertext copied into another room's message fails
+        if key_room_id != int(room_id):
+            raise ValueError(f"Key {key_id} does not belong to room {room_id}")
+        raw = base64.b64decode(data)
+        aad = f"{room_id}:{key_id}".encode()
+        return aead.decrypt(raw[:12], raw[12:], aad).decode("utf-8")
+
+    def decrypt(self, ciphertext, room_id):
+        """Decrypt a message stored in room ``room_id``."""
+        key_id, data = ciphertext[len(PREFIX) :].split(":", 1)
+        key_id = int(key_id)
+        key_room_id, aead = self._key(key_id)
+        return self._unseal(key_id, key_room_id, aead, room_id, data)
+
+    async def adecrypt(self, ciphertext, room_id):
+        key_id, data = ciphertext[len(PREFIX) :].split(":", 1)
+        key_id = int(key_id)
+        with self.lock:
+            entry = self._keys.get(key_id)
+        if entry is None:
+            return await database_sync_to_async(self.decrypt)(ciphertext, room_id)
+        return self._unseal(key_id, *entry, room_id, data)
+
+
+# Global instance
+room_keys = RoomSessionKeys(settings.ROOM_KEY_FILE)
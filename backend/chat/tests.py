@@ -1,3 +1,646 @@
-from django.test import TestCase
+import asyncio
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from groot.cache import TwoTierCache
+
+from . import codec
+from .codec import FrameCodecMixin
+from .layer_server import serve
+from .contacts import ContactCache, contact_cache
+from .membership import ParticipantCache, room_members, room_participants
+from .models import Message, Room, RoomKey
+from .persistence import MessageWriteBehind, SnowflakeIds, _worker_id
+from .presence import PresenceService
+from .search import SearchIndex, search_index
+from .typing import TypingThrottle
+from .session_keys import RoomSessionKeys, ServerKeyring, engines
+
+User = get_user_model()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LayerServerTests(SimpleTestCase):
+    """The Redis-protocol channel layer, against ``layer_server`` in-process."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.port = _free_port()
+        ready = threading.Event()
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        cls.server = asyncio.run_coroutine_threadsafe(
+            serve(port=cls.port, ready=ready), cls.loop
+        )
+        ready.wait(5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.cancel()
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join(5)
+        cls.loop.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        layers = {
+            "default": {
+                "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+                "CONFIG": {"hosts": [f"redis://127.0.0.1:{self.port}"]},
+            }
+        }
+        override = override_settings(CHANNEL_LAYERS=layers)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    async def _receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), 2)
+
+    async def test_send_receive(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+
+        await layer.send(channel, {"type": "chat.message", "text": "hello"})
+
+        message = await self._receive(layer, channel)
+        self.assertEqual(message, {"type": "chat.message", "text": "hello"})
+        await layer.flush()
+
+    async def test_group_send_reaches_every_member(self):
+        layer = get_channel_layer()
+        first = await layer.new_channel()
+        second = await layer.new_channel()
+        await layer.group_add("room_1", first)
+        await layer.group_add("room_1", second)
+
+        await layer.group_send("room_1", {"type": "chat.message", "text": "hi"})
+
+        for channel in (first, second):
+            message = await self._receive(layer, channel)
+            self.assertEqual(message["text"], "hi")
+        await layer.flush()
+
+    async def test_group_discard(self):
+        layer = get_channel_layer()
+        kept = await layer.new_channel()
+        dropped = await layer.new_channel()
+        await layer.group_add("room_1", kept)
+        await layer.group_add("room_1", dropped)
+
+        await layer.group_discard("room_1", dropped)
+        await layer.group_send("room_1", {"type": "chat.message", "text": "hi"})
+
+        message = await self._receive(layer, kept)
+        self.assertEqual(message["text"], "hi")
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(dropped), 0.5)
+        await layer.flush()
+
+
+class MessageWriteBehindTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="a@example.com", username="a", password="pass"
+        )
+        self.room = Room.objects.create(name="room")
+        self.room.participants.add(self.user)
+        self.writer = MessageWriteBehind(SnowflakeIds(1))
+
+    def _message(self, message_id, content):
+        return Message(id=message_id, room=self.room, sender=self.user, content=content)
+
+    async def test_flush_writes_every_saved_message(self):
+        saved = [
+            await self.writer.save(self.room.id, self.user.id, f"m{i}")
+            for i in range(20)
+        ]
+        await self.writer.wait_flushed()
+        self.writer._task.cancel()
+
+        stored = [m async for m in Message.objects.order_by("id")]
+        self.assertEqual([m.id for m in stored], [m.id for m in saved])
+        self.assertEqual([m.content for m in stored], [f"m{i}" for i in range(20)])
+
+    async def test_taken_id_is_replaced_not_dropped(self):
+        taken = SnowflakeIds(2).next_id()
+        await Message.objects.acreate(
+            id=taken, room=self.room, sender=self.user, content="other worker"
+        )
+        message = self._message(taken, "mine")
+
+        with self.assertLogs("chat.persistence", "WARNING"):
+            await self.writer._write([message])
+
+        self.assertNotEqual(message.id, taken)
+        stored = await Message.objects.aget(id=message.id)
+        self.assertEqual(stored.content, "mine")
+        self.assertEqual(await Message.objects.acount(), 2)
+
+    async def test_rewriting_a_written_batch_keeps_its_ids(self):
+        message = self._message(SnowflakeIds(1).next_id(), "once")
+        await self.writer._write([message])
+        message_id = message.id
+
+        # The batch is retried after its commit was already applied
+        await self.writer._write([message])
+
+        self.assertEqual(message.id, message_id)
+        self.assertEqual(await Message.objects.acount(), 1)
+
+
+class WorkerIdTests(SimpleTestCase):
+    @override_settings(MESSAGE_WRITE_BEHIND=True, MESSAGE_ID_WORKER=None)
+    def test_write_behind_requires_a_worker_id(self):
+        with self.assertRaises(ImproperlyConfigured):
+            _worker_id()
+
+    @override_settings(MESSAGE_WRITE_BEHIND=True, MESSAGE_ID_WORKER="3")
+    def test_configured_worker_id(self):
+        self.assertEqual(_worker_id(), 3)
+
+    def test_ids_increase(self):
+        ids = SnowflakeIds(0)
+        generated = [ids.next_id() for _ in range(1000)]
+        self.assertEqual(generated, sorted(set(generated)))
+
+
+class DirectChatTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(
+                email=f"{name}@example.com", username=name, password="pass"
+            )
+            for name in ("alice", "bob", "carol")
+        ]
+        self.client = APIClient()
+
+    def _start(self, user, other):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse("start-dm"), {"user_id": other.id})
+
+    def test_pair_gets_one_room_from_either_side(self):
+        first = self._start(self.alice, self.bob)
+        second = self._start(self.bob, self.alice)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["id"], second.data["id"])
+        self.assertEqual(Room.objects.count(), 1)
+
+    def test_direct_chat_cannot_be_joined(self):
+        room_id = self._start(self.alice, self.bob).data["id"]
+
+        self.client.force_authenticate(self.carol)
+        response = self.client.post(reverse("room-join", args=[room_id]))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        room = Room.objects.get(pk=room_id)
+        self.assertEqual(room.participants.count(), 2)
+
+    def test_group_room_can_be_joined(self):
+        room = Room.objects.create(name="general")
+
+        self.client.force_authenticate(self.carol)
+        response = self.client.post(reverse("room-join", args=[room.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(room.participants.filter(pk=self.carol.pk).exists())
+
+
+class ServerKeyringTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "keys.pkl"
+        self.kem = engines["kyber768"]
+
+    def test_first_boot_creates_one_key(self):
+        # Each worker process has its own keyring; only the file is shared
+        keyrings = [ServerKeyring(self.path, self.kem) for _ in range(8)]
+        with ThreadPoolExecutor(len(keyrings)) as pool:
+            current = list(pool.map(lambda keyring: keyring.current(), keyrings))
+
+        self.assertEqual(len(set(current)), 1)
+        self.assertEqual(list(self.path.parent.glob("*.tmp")), [])
+
+    def test_live_keyring_picks_up_a_new_key(self):
+        live = ServerKeyring(self.path, self.kem)
+        live.current()
+
+        key_id = ServerKeyring(self.path, self.kem).add()
+
+        self.assertEqual(live.current()[0], key_id)
+        self.assertIsNotNone(live.decapsulation_key(key_id))
+
+    def test_concurrent_adds_keep_every_key(self):
+        keyrings = [ServerKeyring(self.path, self.kem) for _ in range(4)]
+        keyrings[0].current()
+        with ThreadPoolExecutor(len(keyrings)) as pool:
+            added = list(pool.map(lambda keyring: keyring.add(), keyrings))
+
+        self.assertEqual(sorted(added), [2, 3, 4, 5])
+        self.assertEqual(ServerKeyring(self.path, self.kem).key_ids(), [1, 2, 3, 4, 5])
+
+    def test_retire_waits_for_the_grace_period(self):
+        keyring = ServerKeyring(self.path, self.kem)
+        keyring.add()
+
+        with self.assertRaises(ValueError):
+            keyring.retire(1, lambda key_id: False, grace=60)
+        keyring.retire(1, lambda key_id: False, grace=0)
+        self.assertEqual(keyring.key_ids(), [2])
+
+
+class RoomSessionKeysTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "keys.pkl"
+        self.room = Room.objects.create(name="room")
+        self.other_room = Room.objects.create(name="other")
+
+    def test_round_trip(self):
+        keys = RoomSessionKeys(self.path)
+        ciphertext = keys.encrypt(self.room.id, "hello")
+
+        self.assertTrue(ciphertext.startswith("s1:"))
+        self.assertEqual(keys.decrypt(ciphertext, self.room.id), "hello")
+        # A restarted process unwraps the stored room key
+        self.assertEqual(
+            RoomSessionKeys(self.path).decrypt(ciphertext, self.room.id), "hello"
+        )
+
+    def test_ciphertext_is_bound_to_its_room(self):
+        keys = RoomSessionKeys(self.path)
+        ciphertext = keys.encrypt(self.room.id, "hello")
+
+        with self.assertRaises(ValueError):
+            keys.decrypt(ciphertext, self.other_room.id)
+
+    def test_rewrapped_room_key_decrypts_in_a_live_process(self):
+        live = RoomSessionKeys(self.path)
+        ciphertext = live.encrypt(self.room.id, "hello")
+
+        # rotate_keys --new-key in another process
+        rotation = RoomSessionKeys(self.path)
+        new_key = rotation.keyring.add()
+        record = RoomKey.objects.get(room=self.room)
+        self.assertTrue(rotation.rewrap(record))
+
+        self.assertEqual(RoomKey.objects.get(pk=record.pk).server_key_id, new_key)
+        self.assertEqual(
+            RoomSessionKeys(self.path).decrypt(ciphertext, self.room.id), "hello"
+        )
+        # Evicted from the unwrapped-key cache, so unwrapped again
+        live._keys.clear()
+        self.assertEqual(live.decrypt(ciphertext, self.room.id), "hello")
+
+
+class PresenceServiceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.events = []
+
+    def _worker(self):
+        service = PresenceService()
+        service.OFFLINE_GRACE = 0.01
+
+        async def announce(user_id, is_online, room_groups, notify_contacts=True):
+            if notify_contacts:
+                self.events.append((user_id, is_online))
+
+        service._announce = announce
+        self.addCleanup(lambda: service._task and service._task.cancel())
+        return service
+
+    async def _settle(self):
+        await asyncio.sleep(0.05)
+
+    async def test_second_socket_does_not_flap(self):
+        worker = self._worker()
+        await worker.connect(1, "tab-1")
+        await worker.connect(1, "tab-2")
+        worker.disconnect("tab-1")
+        await self._settle()
+
+        self.assertEqual(self.events, [(1, True)])
+        worker.disconnect("tab-2")
+        await self._settle()
+        self.assertEqual(self.events, [(1, True), (1, False)])
+
+    async def test_reconnect_inside_grace_is_silent(self):
+        worker = self._worker()
+        await worker.connect(1, "old")
+        worker.disconnect("old")
+        await worker.connect(1, "new")
+        await self._settle()
+
+        self.assertEqual(self.events, [(1, True)])
+
+    async def test_online_until_the_last_worker_lets_go(self):
+        first, second = self._worker(), self._worker()
+        await first.connect(1, "first")
+        await second.connect(1, "second")
+        self.assertEqual(self.events, [(1, True)])
+
+        first.disconnect("first")
+        await self._settle()
+        self.assertEqual(self.events, [(1, True)])
+
+        second.disconnect("second")
+        await self._settle()
+        self.assertEqual(self.events, [(1, True), (1, False)])
+
+
+class TypingThrottleTests(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+        self.throttle = TypingThrottle()
+        self.throttle.MIN_INTERVAL = 0.05
+        self.throttle.TIMEOUT = 0.2
+
+        async def broadcast(key, username, is_typing):
+            self.sent.append(is_typing)
+
+        self.throttle._broadcast = broadcast
+
+    async def test_keystrokes_coalesce_into_one_start(self):
+        for _ in range(20):
+            self.throttle.update(1, 2, "alice", True)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.sent, [True])
+
+    async def test_quick_pause_sends_nothing(self):
+        self.throttle.update(1, 2, "alice", True)
+        self.throttle.update(1, 2, "alice", False)
+        self.throttle.update(1, 2, "alice", True)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.sent, [True])
+
+    async def test_silent_client_is_stopped(self):
+        self.throttle.update(1, 2, "alice", True)
+        await asyncio.sleep(0.3)
+
+        self.assertEqual(self.sent, [True, False])
+        self.assertEqual(self.throttle._states, {})
+
+    async def test_broadcast_errors_are_logged(self):
+        async def broadcast(key, username, is_typing):
+            raise ConnectionError("layer down")
+
+        self.throttle._broadcast = broadcast
+        with self.assertLogs("chat.fanout", "ERROR"):
+            self.throttle.update(1, 2, "alice", True)
+            await asyncio.sleep(0.01)
+
+
+class _Squares(TwoTierCache):
+    key_prefix = "test_squares"
+    MAX_LOCAL = 3
+
+    def _load(self, key):
+        return key * key
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.squares = _Squares()
+
+    def test_local_tier_is_bounded(self):
+        for key in range(1, 6):
+            self.assertEqual(self.squares.get(key), key * key)
+
+        self.assertEqual(len(self.squares._local), 3)
+        self.assertIsNone(self.squares.get_local(1))
+        self.assertEqual(self.squares.get_local(5), 25)
+
+    def test_least_recently_used_goes_first(self):
+        for key in (1, 2, 3):
+            self.squares.get(key)
+        self.squares.get_local(1)
+        self.squares.get(4)
+
+        self.assertEqual(self.squares.get_local(1), 1)
+        self.assertIsNone(self.squares.get_local(2))
+
+    def test_invalidate_drops_both_tiers(self):
+        self.squares.set(2, 5)
+        self.squares.invalidate([2])
+
+        self.assertIsNone(self.squares.get_local(2))
+        self.assertEqual(self.squares.get(2), 4)
+
+
+class _EchoConsumer(FrameCodecMixin, AsyncWebsocketConsumer):
+    async def connect(self):
+        await self.accept()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.send_frame(self.decode_frame(text_data, bytes_data))
+
+
+class FrameCodecTests(SimpleTestCase):
+    payload = {"type": "chat_message", "message": "héllo", "room_id": 3}
+
+    async def _connect(self, subprotocols=None):
+        communicator = WebsocketCommunicator(
+            _EchoConsumer.as_asgi(), "/ws/echo/", subprotocols=subprotocols
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, subprotocol
+
+    async def test_msgpack_when_offered(self):
+        communicator, subprotocol = await self._connect(["msgpack", "json"])
+        self.assertEqual(subprotocol, "msgpack")
+
+        await communicator.send_to(bytes_data=msgpack.packb(self.payload))
+        frame = await communicator.receive_output()
+
+        self.assertEqual(msgpack.unpackb(frame["bytes"]), self.payload)
+        await communicator.disconnect()
+
+    async def test_json_without_subprotocol(self):
+        communicator, subprotocol = await self._connect()
+        self.assertIsNone(subprotocol)
+
+        await communicator.send_json_to(self.payload)
+
+        self.assertEqual(await communicator.receive_json_from(), self.payload)
+        await communicator.disconnect()
+
+    async def test_text_frames_accepted_from_msgpack_clients(self):
+        communicator, _ = await self._connect(["msgpack"])
+
+        await communicator.send_json_to(self.payload)
+        frame = await communicator.receive_output()
+
+        self.assertEqual(msgpack.unpackb(frame["bytes"]), self.payload)
+        await communicator.disconnect()
+
+    async def test_json_when_msgpack_is_not_installed(self):
+        with mock.patch.object(codec, "msgpack", None):
+            communicator, subprotocol = await self._connect(["msgpack", "json"])
+            self.assertEqual(subprotocol, "json")
+
+            await communicator.send_json_to(self.payload)
+            self.assertEqual(await communicator.receive_json_from(), self.payload)
+            await communicator.disconnect()
+
+
+class MessageSearchTests(TestCase):
+    texts = ["Hello world", "hello there", "World peace", "HELLO, World!"]
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="a@example.com", username="a", password="pass"
+        )
+        self.outsider = User.objects.create_user(
+            email="b@example.com", username="b", password="pass"
+        )
+        self.room = Room.objects.create(name="room")
+        self.room.participants.add(self.user)
+        # Ids repeat between tests, so drop answers cached by earlier ones
+        room_participants.invalidate(
+            [(self.room.id, self.user.id), (self.room.id, self.outsider.id)]
+        )
+        self.other_room = Room.objects.create(name="other")
+        self.ids = []
+        for text in self.texts:
+            message = Message.objects.create(
+                room=self.room, sender=self.user, content="sealed"
+            )
+            search_index.index_message(message.id, self.room.id, text)
+            self.ids.append(message.id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get(self, **params):
+        url = reverse("message-search", args=[self.room.id])
+        return self.client.get(url, params)
+
+    def test_every_word_must_match_newest_first(self):
+        self.assertEqual(
+            search_index.search(self.room.id, "world hello"),
+            [self.ids[3], self.ids[0]],
+        )
+        self.assertEqual(search_index.search(self.room.id, "peace"), [self.ids[2]])
+        self.assertEqual(search_index.search(self.room.id, "a"), [])
+
+    def test_tokens_are_bound_to_the_room_and_key(self):
+        self.assertEqual(search_index.search(self.other_room.id, "hello"), [])
+        other_key = SearchIndex("another key")
+        self.assertNotEqual(
+            other_key.token(self.room.id, "hello"),
+            search_index.token(self.room.id, "hello"),
+        )
+
+    def test_pages_with_cursor(self):
+        first = self._get(q="hello", limit=2).data
+        self.assertEqual(first["results"], [self.ids[3], self.ids[1]])
+
+        second = self._get(q="hello", limit=2, cursor=first["next_cursor"]).data
+        self.assertEqual(second["results"], [self.ids[0]])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({"q": ""}, {"q": "hi", "limit": 0}, {"q": "hi", "limit": 101}):
+            self.assertEqual(self._get(**params).status_code, 400, params)
+        self.assertEqual(self._get(q="hi", cursor="x").status_code, 400)
+
+    def test_participants_only(self):
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self._get(q="hello").status_code, 403)
+
+
+class ParticipantCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="a@example.com", username="a", password="pass"
+        )
+        self.room = Room.objects.create(name="room")
+        room_members.invalidate([self.room.id])
+        self.key = (self.room.id, self.user.id)
+
+    def test_negative_answers_stay_out_of_the_local_tier(self):
+        participants = ParticipantCache()
+
+        self.assertFalse(participants.get(self.key))
+        self.assertIsNone(participants.get_local(self.key))
+
+        self.room.participants.add(self.user)
+        participants.set(self.key, True)
+        self.assertTrue(participants.get_local(self.key))
+
+    def test_join_on_another_worker_is_seen_at_once(self):
+        this_worker, joining_worker = ParticipantCache(), ParticipantCache()
+        self.assertFalse(this_worker.get(self.key))
+        # A member set loaded before the join
+        room_members.get(self.room.id)
+
+        self.room.participants.add(self.user)
+        joining_worker.set(self.key, True)
+
+        self.assertTrue(this_worker.get(self.key))
+
+    def test_member_set_answers_yes(self):
+        self.room.participants.add(self.user)
+        room_members.get(self.room.id)
+
+        self.assertTrue(ParticipantCache().get_local(self.key))
+
+
+class ContactCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(
+                email=f"{name}@example.com", username=name, password="pass"
+            )
+            for name in ("alice", "bob", "carol")
+        ]
+        self.room = Room.objects.create(name="room")
+        self.room.participants.add(self.alice, self.bob)
+        contact_cache.invalidate([self.alice.id, self.bob.id, self.carol.id])
+
+    def test_contacts_share_a_room(self):
+        contacts = ContactCache()
+        self.assertEqual(contacts.get(self.alice.id), {self.bob.id})
+        self.assertEqual(contacts.get(self.carol.id), frozenset())
+
+    def test_joining_updates_everyone_in_the_room(self):
+        self.assertEqual(contact_cache.get(self.alice.id), {self.bob.id})
+
+        client = APIClient()
+        client.force_authenticate(self.carol)
+        client.post(reverse("room-join", args=[self.room.id]))
+
+        self.assertEqual(contact_cache.get(self.alice.id), {self.bob.id, self.carol.id})
+        self.assertEqual(contact_cache.get(self.carol.id), {self.alice.id, self.bob.id})
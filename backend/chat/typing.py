@@ -0,0 +1,91 @@
+import asyncio
+
+from channels.layers import get_channel_layer
+
+from .fanout import spawn
+
+
+class _TypingState:
+    __slots__ = ("username", "wanted", "sent", "flush", "expiry")
+
+    def __init__(self, username):
+        self.username = username
+        self.wanted = False  # latest state reported by the client
+        self.sent = False  # last state broadcast to the room
+        self.flush = None  # deferred broadcast, if throttled
+        self.expiry = None  # automatic stop if the client goes quiet
+
+
+class TypingThrottle:
+    """
+    Turns a stream of per-keystroke ``typing`` frames into at most one
+    start or stop broadcast per user and room every ``MIN_INTERVAL``
+    seconds.
+
+    Repeated starts only push back the automatic stop, which fires after
+    ``TIMEOUT`` seconds without a frame, so clients that never send a stop
+    (closed tab, dropped socket) still clear the indicator. A stop that
+    lands inside the interval is deferred, and a start arriving before it
+    fires cancels both, so short pauses produce no traffic at all.
+
+    State is kept per worker and all methods run on the event loop.
+    """
+
+    MIN_INTERVAL = 1.0
+    TIMEOUT = 5
+
+    def __init__(self):
+        self._states = {}  # (room_id, user_id) -> _TypingState
+
+    def update(self, room_id, user_id, username, is_typing):
+        key = (room_id, user_id)
+        state = self._states.get(key)
+        if state is None:
+            if not is_typing:
+                return
+            state = self._states[key] = _TypingState(username)
+
+        state.wanted = is_typing
+        if state.expiry is not None:
+            state.expiry.cancel()
+            state.expiry = None
+        if is_typing:
+            state.expiry = asyncio.get_running_loop().call_later(
+                self.TIMEOUT, self.update, room_id, user_id, username, False
+            )
+
+        if state.flush is not None:
+            # The pending flush picks up the latest state
+            return
+        if state.wanted != state.sent:
+            self._flush(key)
+
+    def _flush(self, key):
+        state = self._states[key]
+        state.flush = None
+        if state.wanted != state.sent:
+            state.sent = state.wanted
+            spawn(self._broadcast(key, state.username, state.sent))
+            # Hold the slot; whatever is reported meanwhile goes out after it
+            state.flush = asyncio.get_running_loop().call_later(
+                self.MIN_INTERVAL, self._flush, key
+            )
+        elif not state.wanted:
+            del self._states[key]
+
+    async def _broadcast(self, key, username, is_typing):
+        room_id, user_id = key
+        await get_channel_layer().group_send(
+            f"chat_{room_id}",
+            {
+                "type": "typing",
+                "room_id": room_id,
+                "user_id": user_id,
+                "username": username,
+                "is_typing": is_typing,
+            },
+        )
+
+
+# Global instance
+typing_throttle = TypingThrottle()
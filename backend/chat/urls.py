@@ -1,4 +1,4 @@
-from .views import RoomListView, MessageListView, JoinRoomView, StartDirectChatView, RoomDetailView
+from .views import RoomListView, MessageListView, JoinRoomView, StartDirectChatView, RoomDetailView, MessageSearchView
 from django.urls import path
 urlpatterns = [
     path('rooms/', RoomListView.as_view(), name='room-list'),
@@ -6,4 +6,5 @@ urlpatterns = [
     path('rooms/<int:pk>/join/', JoinRoomView.as_view(), name='room-join'),
     path('dm/', StartDirectChatView.as_view(), name='start-dm'),
     path('rooms/<int:room_id>/messages/', MessageListView.as_view(), name='message-list'),
+    path('rooms/<int:room_id>/messages/search/', MessageSearchView.as_view(), name='message-search'),
 ]
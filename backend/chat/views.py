@@ -1,8 +1,14 @@
 from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
+from .contacts import contact_cache
+from .membership import room_members, room_participants
 from .models import Room, Message
+from .persistence import message_ids
+from .search import search_index
 from .serializers import RoomSerializer, MessageSerializer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 User = get_user_model()
 
@@ -16,6 +22,8 @@ class RoomListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         room = serializer.save()
         room.participants.add(self.request.user)
+        room_members.invalidate([room.id])
+        room_participants.set((room.id, self.request.user.id), True)
 
 class RoomDetailView(generics.RetrieveAPIView):
     serializer_class = RoomSerializer
@@ -28,7 +36,14 @@ class JoinRoomView(views.APIView):
     def post(self, request, pk):
         try:
             room = Room.objects.get(pk=pk)
+            if room.dm_key is not None:
+                # Direct chats are looked up by their pair; a third member
+                # would turn up as that pair's private room
+                return Response({"error": "Direct chats cannot be joined"}, status=status.HTTP_403_FORBIDDEN)
             room.participants.add(request.user)
+            contact_cache.invalidate_room(room)
+            room_members.invalidate([room.id])
+            room_participants.set((room.id, request.user.id), True)
             return Response(RoomSerializer(room).data, status=status.HTTP_200_OK)
         except Room.DoesNotExist:
             return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -66,7 +81,14 @@ class MessageListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         room_id = self.kwargs['room_id']
         room = Room.objects.get(pk=room_id)
-        serializer.save(sender=self.request.user, room=room)
+        # The serializer encrypts the content; index the plaintext first
+        plaintext = serializer.validated_data.get("content", "")
+        if settings.MESSAGE_WRITE_BEHIND:
+            # Share the id space with write-behind messages from the sockets
+            message = serializer.save(sender=self.request.user, room=room, id=message_ids.next_id())
+        else:
+            message = serializer.save(sender=self.request.user, room=room)
+        search_index.index_message(message.id, room.id, plaintext)
         
         # Try to invalidate cache, but don't fail if Redis is unavailable
         cache_key = f"messages_room_{room_id}"
@@ -77,6 +99,32 @@ class MessageListView(generics.ListCreateAPIView):
             print(f"Cache unavailable, skipping cache delete: {e}")
             pass
 
+class MessageSearchView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_LIMIT = 100
+
+    def get(self, request, room_id):
+        if not room_participants.get((room_id, request.user.id)):
+            return Response({"error": "Not a participant of this room"}, status=status.HTTP_403_FORBIDDEN)
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "cursor and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {self.MAX_LIMIT}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Newest first; pass next_cursor back as cursor for the next page
+        message_ids = search_index.search(room_id, query, before=cursor, limit=limit)
+        next_cursor = message_ids[-1] if len(message_ids) == limit else None
+        return Response({"results": message_ids, "next_cursor": next_cursor})
+
 class StartDirectChatView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -90,23 +138,30 @@ class StartDirectChatView(views.APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Check for existing 1-on-1 room
-        rooms = Room.objects.filter(participants=request.user).filter(participants=other_user)
-        
-        existing_room = None
-        for room in rooms:
-            if room.participants.count() == 2:
-                existing_room = room
-                break
-        
+        # Canonical key for the pair; the unique index makes this one lookup
+        dm_key = Room.make_dm_key(request.user.id, other_user.id)
+
+        existing_room = Room.objects.filter(dm_key=dm_key).first()
         if existing_room:
             return Response(RoomSerializer(existing_room).data)
         
-        # Create new room
+        # Create new room. If a concurrent request for the same pair wins the
+        # insert, the unique index rejects ours and get_or_create returns theirs.
         import uuid
         room_name = f"dm-{uuid.uuid4()}"
         
-        room = Room.objects.create(name=room_name)
-        room.participants.add(request.user, other_user)
+        with transaction.atomic():
+            room, created = Room.objects.get_or_create(
+                dm_key=dm_key, defaults={"name": room_name}
+            )
+            if created:
+                room.participants.add(request.user, other_user)
+
+        if not created:
+            return Response(RoomSerializer(room).data)
+
+        contact_cache.invalidate([request.user.id, other_user.id])
+        for user in (request.user, other_user):
+            room_participants.set((room.id, user.id), True)
         
         return Response(RoomSerializer(room).data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+
+
+class TwoTierCache:
+    """
+    Read-through cache with a small per-process dict in front of the shared
+    Django cache (Redis).
+
+    Subclasses set ``key_prefix`` and implement ``_load``. The local tier
+    uses a short TTL so that other workers pick up an invalidation without
+    any cross-process signalling, and holds at most ``MAX_LOCAL`` entries,
+    least recently used first out. Shared-cache failures are swallowed, in
+    which case lookups simply fall through to the database.
+    """
+
+    key_prefix = None
+    LOCAL_TTL = 30
+    SHARED_TTL = 60 * 10
+    MAX_LOCAL = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._local = OrderedDict()  # cache_key -> (expires_at, value)
+
+    def _cache_key(self, key):
+        return f"{self.key_prefix}_{key}"
+
+    def _load(self, key):
+        raise NotImplementedError
+
+    def get_local(self, key):
+        """Return the value cached in this process, or None."""
+        cache_key = self._cache_key(key)
+        with self.lock:
+            entry = self._local.get(cache_key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[cache_key]
+                return None
+            self._local.move_to_end(cache_key)
+            return value
+
+    def get(self, key):
+        """
+        Return the value for ``key``, loading it if needed.
+        Blocking: use ``aget`` from async code.
+        """
+        value = self.get_local(key)
+        if value is not None:
+            return value
+
+        cache_key = self._cache_key(key)
+        try:
+            value = cache.get(cache_key)
+        except Exception:
+            # Redis not available, fall through to the database
+            value = None
+
+        if value is None:
+            value = self._load(key)
+            try:
+                cache.set(cache_key, value, timeout=self.SHARED_TTL)
+            except Exception:
+                pass
+
+        self._set_local(cache_key, value)
+        return value
+
+    async def aget(self, key):
+        # Served from the in-process tier without a thread hop when warm
+        value = self.get_local(key)
+        if value is None:
+            value = await database_sync_to_async(self.get)(key)
+        return value
+
+    def _set_local(self, cache_key, value):
+        with self.lock:
+            self._local[cache_key] = (time.monotonic() + self.LOCAL_TTL, value)
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.MAX_LOCAL:
+                self._local.popitem(last=False)
+
+    def set(self, key, value):
+        """Warm both tiers with a value the caller already knows."""
+        cache_key = self._cache_key(key)
+        self._set_local(cache_key, value)
+        try:
+            cache.set(cache_key, value, timeout=self.SHARED_TTL)
+        except Exception as e:
+            print(f"Cache unavailable, skipping {self.key_prefix} update: {e}")
+
+    def invalidate(self, keys):
+        cache_keys = [self._cache_key(key) for key in keys]
+        with self.lock:
+            for cache_key in cache_keys:
+                self._local.pop(cache_key, None)
+        try:
+            cache.delete_many(cache_keys)
+        except Exception as e:
+            print(f"Cache unavailable, skipping {self.key_prefix} invalidation: {e}")
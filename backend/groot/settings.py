@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -111,17 +112,86 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# WebSocket auth: trust the profile claims in the access token instead of
+# loading the user row on every handshake (see chat/middleware.py)
+WS_JWT_STATELESS = True
+
+# Opt-in write-behind persistence of websocket messages (chat/persistence.py):
+# messages get snowflake ids up front and are broadcast before the batched
+# write. MESSAGE_ID_WORKER (0-15) must differ between worker processes and
+# is required with write-behind; startup fails without it.
+MESSAGE_WRITE_BEHIND = os.environ.get("MESSAGE_WRITE_BEHIND") == "1"
+MESSAGE_ID_WORKER = os.environ.get("MESSAGE_ID_WORKER")
+
+# Key for the message search index (chat/search.py). Changing it requires
+# running rebuild_search_index.
+SEARCH_INDEX_KEY = os.environ.get("SEARCH_INDEX_KEY", SECRET_KEY)
+
+# Per-room message keys (chat/session_keys.py). Each room key is
+# encapsulated to the key pair in ROOM_KEY_FILE and replaced after
+# ROOM_KEY_MAX_MESSAGES messages per process or ROOM_KEY_MAX_AGE seconds.
+ROOM_SESSION_KEYS = os.environ.get("ROOM_SESSION_KEYS", "1") == "1"
+ROOM_KEY_FILE = BASE_DIR / "room_kem_keys.pkl"
+ROOM_KEY_MAX_MESSAGES = int(os.environ.get("ROOM_KEY_MAX_MESSAGES", "100000"))
+ROOM_KEY_MAX_AGE = int(os.environ.get("ROOM_KEY_MAX_AGE", str(60 * 60 * 24 * 7)))
+# rotate_keys --retire keeps old server keys until the current one has been
+# current this long, so every process has switched over to it
+SERVER_KEY_RETIRE_GRACE = int(os.environ.get("SERVER_KEY_RETIRE_GRACE", "600"))
+
+# Encryption noise for the server Kyber key, precomputed in NTT form by a
+# background thread (kyber_funcs.NoisePool). The pool holds up to
+# KYBER_NOISE_POOL single-use tuples; 0 samples on the request path.
+KYBER_NOISE_POOL = int(os.environ.get("KYBER_NOISE_POOL", "0"))
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+# Run against SQLite by default. Set DB_ENGINE (and DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT) to use a server database instead, e.g.
+# DB_ENGINE=django.db.backends.postgresql with psycopg installed.
+DB_ENGINE = os.environ.get("DB_ENGINE", "django.db.backends.sqlite3")
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# writer, synchronous=NORMAL only syncs at checkpoints (safe in WAL mode, the
+# last commits can be lost on power failure), and IMMEDIATE transactions take
+# the write lock up front instead of failing with "database is locked" when
+# a read transaction tries to upgrade. Writers wait up to "timeout" seconds.
+SQLITE_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA mmap_size=134217728;"
+        "PRAGMA temp_store=MEMORY"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": 20,
 }
 
+if DB_ENGINE == "django.db.backends.sqlite3":
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": SQLITE_OPTIONS,
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": os.environ["DB_NAME"],
+            "USER": os.environ.get("DB_USER", ""),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", ""),
+            "PORT": os.environ.get("DB_PORT", ""),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -162,11 +232,27 @@ CACHES = {
 }
 
 # Channel Layers for WebSockets
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# CHANNEL_LAYER_URL points every ASGI worker at a shared Redis-protocol
+# server (real Redis, or `manage.py run_layer_server` in development).
+# Without it the single-process in-memory layer is used.
+CHANNEL_LAYER_URL = os.environ.get("CHANNEL_LAYER_URL")
+CHANNEL_LAYER_BACKEND = os.environ.get(
+    "CHANNEL_LAYER_BACKEND", "channels_redis.pubsub.RedisPubSubChannelLayer"
+)
+
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": CHANNEL_LAYER_BACKEND,
+            "CONFIG": {"hosts": [CHANNEL_LAYER_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
     }
-}
 
 # Internationalization
 LANGUAGE_CODE = "en-us"
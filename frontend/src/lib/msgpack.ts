@@ -0,0 +1,242 @@
+/**
+ * Minimal MessagePack codec for websocket frames.
+ *
+ * Covers the types the chat protocol uses: nil, booleans, numbers,
+ * strings, binary, arrays and string-keyed maps. Extension types are
+ * rejected.
+ */
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+class Writer {
+    private buffer = new Uint8Array(256);
+    private view = new DataView(this.buffer.buffer);
+    length = 0;
+
+    private reserve(size: number) {
+        if (this.length + size <= this.buffer.length) return;
+        let capacity = this.buffer.length * 2;
+        while (capacity < this.length + size) capacity *= 2;
+        const buffer = new Uint8Array(capacity);
+        buffer.set(this.buffer);
+        this.buffer = buffer;
+        this.view = new DataView(buffer.buffer);
+    }
+
+    u8(value: number) {
+        this.reserve(1);
+        this.view.setUint8(this.length, value);
+        this.length += 1;
+    }
+
+    u16(value: number) {
+        this.reserve(2);
+        this.view.setUint16(this.length, value);
+        this.length += 2;
+    }
+
+    u32(value: number) {
+        this.reserve(4);
+        this.view.setUint32(this.length, value);
+        this.length += 4;
+    }
+
+    i32(value: number) {
+        this.reserve(4);
+        this.view.setInt32(this.length, value);
+        this.length += 4;
+    }
+
+    i64(value: number) {
+        this.reserve(8);
+        this.view.setBigInt64(this.length, BigInt(value));
+        this.length += 8;
+    }
+
+    f64(value: number) {
+        this.reserve(8);
+        this.view.setFloat64(this.length, value);
+        this.length += 8;
+    }
+
+    bytes(value: Uint8Array) {
+        this.reserve(value.length);
+        this.buffer.set(value, this.length);
+        this.length += value.length;
+    }
+
+    result(): Uint8Array<ArrayBuffer> {
+        return this.buffer.slice(0, this.length);
+    }
+}
+
+// [fix marker, largest fix length, 8-bit, 16-bit, 32-bit length markers]
+type Markers = [number | null, number, number | null, number, number];
+const STR: Markers = [0xa0, 31, 0xd9, 0xda, 0xdb];
+const BIN: Markers = [null, -1, 0xc4, 0xc5, 0xc6];
+const ARRAY: Markers = [0x90, 15, null, 0xdc, 0xdd];
+const MAP: Markers = [0x80, 15, null, 0xde, 0xdf];
+
+function writeHeader(writer: Writer, length: number, [fix, fixMax, m8, m16, m32]: Markers) {
+    if (fix !== null && length <= fixMax) {
+        writer.u8(fix | length);
+    } else if (m8 !== null && length <= 0xff) {
+        writer.u8(m8);
+        writer.u8(length);
+    } else if (length <= 0xffff) {
+        writer.u8(m16);
+        writer.u16(length);
+    } else {
+        writer.u8(m32);
+        writer.u32(length);
+    }
+}
+
+function writeValue(writer: Writer, value: any) {
+    if (value === null || value === undefined) {
+        writer.u8(0xc0);
+    } else if (typeof value === 'boolean') {
+        writer.u8(value ? 0xc3 : 0xc2);
+    } else if (typeof value === 'number') {
+        if (!Number.isSafeInteger(value)) {
+            writer.u8(0xcb);
+            writer.f64(value);
+        } else if (value >= 0 && value < 0x80) {
+            writer.u8(value);
+        } else if (value < 0 && value >= -0x20) {
+            writer.u8(value & 0xff);
+        } else if (value >= 0 && value <= 0xffff) {
+            writer.u8(0xcd);
+            writer.u16(value);
+        } else if (value >= 0 && value <= 0xffffffff) {
+            writer.u8(0xce);
+            writer.u32(value);
+        } else if (value >= -0x80000000 && value < 0) {
+            writer.u8(0xd2);
+            writer.i32(value);
+        } else {
+            writer.u8(0xd3);
+            writer.i64(value);
+        }
+    } else if (typeof value === 'string') {
+        const encoded = textEncoder.encode(value);
+        writeHeader(writer, encoded.length, STR);
+        writer.bytes(encoded);
+    } else if (value instanceof Uint8Array) {
+        writeHeader(writer, value.length, BIN);
+        writer.bytes(value);
+    } else if (Array.isArray(value)) {
+        writeHeader(writer, value.length, ARRAY);
+        value.forEach((item) => writeValue(writer, item));
+    } else if (typeof value === 'object') {
+        const entries = Object.entries(value).filter(([, item]) => item !== undefined);
+        writeHeader(writer, entries.length, MAP);
+        entries.forEach(([key, item]) => {
+            writeValue(writer, key);
+            writeValue(writer, item);
+        });
+    } else {
+        throw new TypeError(`Cannot encode ${typeof value} as MessagePack`);
+    }
+}
+
+export function encode(value: any): Uint8Array<ArrayBuffer> {
+    const writer = new Writer();
+    writeValue(writer, value);
+    return writer.result();
+}
+
+class Reader {
+    private view: DataView;
+    private bytes: Uint8Array;
+    offset = 0;
+
+    constructor(bytes: Uint8Array) {
+        this.bytes = bytes;
+        this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    }
+
+    private advance(size: number): number {
+        const offset = this.offset;
+        if (offset + size > this.bytes.length) throw new RangeError('Truncated MessagePack frame');
+        this.offset += size;
+        return offset;
+    }
+
+    u8() { return this.view.getUint8(this.advance(1)); }
+    u16() { return this.view.getUint16(this.advance(2)); }
+    u32() { return this.view.getUint32(this.advance(4)); }
+    i8() { return this.view.getInt8(this.advance(1)); }
+    i16() { return this.view.getInt16(this.advance(2)); }
+    i32() { return this.view.getInt32(this.advance(4)); }
+    i64() { return Number(this.view.getBigInt64(this.advance(8))); }
+    u64() { return Number(this.view.getBigUint64(this.advance(8))); }
+    f32() { return this.view.getFloat32(this.advance(4)); }
+    f64() { return this.view.getFloat64(this.advance(8)); }
+
+    raw(length: number): Uint8Array {
+        const offset = this.advance(length);
+        return this.bytes.subarray(offset, offset + length);
+    }
+
+    str(length: number): string {
+        return textDecoder.decode(this.raw(length));
+    }
+
+    array(length: number): any[] {
+        const items = new Array(length);
+        for (let i = 0; i < length; i++) items[i] = this.value();
+        return items;
+    }
+
+    map(length: number): Record<string, any> {
+        const result: Record<string, any> = {};
+        for (let i = 0; i < length; i++) {
+            const key = this.value();
+            result[String(key)] = this.value();
+        }
+        return result;
+    }
+
+    value(): any {
+        const type = this.u8();
+        if (type < 0x80) return type;
+        if (type < 0x90) return this.map(type & 0x0f);
+        if (type < 0xa0) return this.array(type & 0x0f);
+        if (type < 0xc0) return this.str(type & 0x1f);
+        if (type >= 0xe0) return type - 0x100;
+
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return this.raw(this.u8()).slice();
+            case 0xc5: return this.raw(this.u16()).slice();
+            case 0xc6: return this.raw(this.u32()).slice();
+            case 0xca: return this.f32();
+            case 0xcb: return this.f64();
+            case 0xcc: return this.u8();
+            case 0xcd: return this.u16();
+            case 0xce: return this.u32();
+            case 0xcf: return this.u64();
+            case 0xd0: return this.i8();
+            case 0xd1: return this.i16();
+            case 0xd2: return this.i32();
+            case 0xd3: return this.i64();
+            case 0xd9: return this.str(this.u8());
+            case 0xda: return this.str(this.u16());
+            case 0xdb: return this.str(this.u32());
+            case 0xdc: return this.array(this.u16());
+            case 0xdd: return this.array(this.u32());
+            case 0xde: return this.map(this.u16());
+            case 0xdf: return this.map(this.u32());
+            default:
+                throw new TypeError(`Unsupported MessagePack type 0x${type.toString(16)}`);
+        }
+    }
+}
+
+export function decode(bytes: Uint8Array): any {
+    return new Reader(bytes).value();
+}
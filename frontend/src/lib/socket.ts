@@ -0,0 +1,163 @@
+/**
+ * One multiplexed WebSocket per client, shared by every useWebSocket hook.
+ *
+ * The server (`ws/`) authenticates once and delivers notifications
+ * unconditionally; rooms are joined with `subscribe`/`unsubscribe` frames.
+ * Frames from the server carry a `stream` key ('notifications' or a room
+ * id); frames without one (presence) go to every listener.
+ *
+ * The client offers the `msgpack` subprotocol and falls back to JSON text
+ * frames when the server does not pick it.
+ */
+
+import { encode, decode } from '@/lib/msgpack';
+
+export type SocketStatus = 'connecting' | 'open' | 'closed';
+type Listener = (data: any) => void;
+
+export const NOTIFICATIONS = 'notifications';
+
+const SUBPROTOCOLS = ['msgpack', 'json'];
+
+// Keeps the server-side presence TTL (60s) fresh on idle sockets
+const HEARTBEAT_INTERVAL = 25000;
+const RECONNECT_DELAY = 3000;
+
+class MultiplexSocket {
+    status: SocketStatus = 'closed';
+    private ws: WebSocket | null = null;
+    private listeners = new Map<string, Set<Listener>>();
+    private statusListeners = new Set<(status: SocketStatus) => void>();
+    private heartbeatInterval: number | null = null;
+    private reconnectTimeout: number | null = null;
+
+    /**
+     * Listen to a stream, subscribing to the room on first use.
+     * Returns a function that removes the listener again.
+     */
+    subscribe(stream: string, listener: Listener): () => void {
+        const streamListeners = this.listeners.get(stream) ?? new Set<Listener>();
+        if (!this.listeners.has(stream)) {
+            this.listeners.set(stream, streamListeners);
+            if (stream !== NOTIFICATIONS) {
+                this.send({ type: 'subscribe', room_id: stream });
+            }
+        }
+        streamListeners.add(listener);
+        this.open();
+
+        return () => {
+            streamListeners.delete(listener);
+            if (streamListeners.size > 0) return;
+            this.listeners.delete(stream);
+            if (stream !== NOTIFICATIONS) {
+                this.send({ type: 'unsubscribe', room_id: stream });
+            }
+            if (this.listeners.size === 0) this.close();
+        };
+    }
+
+    onStatus(listener: (status: SocketStatus) => void): () => void {
+        this.statusListeners.add(listener);
+        return () => {
+            this.statusListeners.delete(listener);
+        };
+    }
+
+    send(data: any): boolean {
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(this.ws.protocol === 'msgpack' ? encode(data) : JSON.stringify(data));
+            return true;
+        }
+        return false;
+    }
+
+    private setStatus(status: SocketStatus) {
+        this.status = status;
+        this.statusListeners.forEach((listener) => listener(status));
+    }
+
+    private open() {
+        if (this.ws) return;
+
+        const token = localStorage.getItem('access_token');
+        if (!token) return;
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const ws = new WebSocket(`${protocol}//localhost:8000/ws/?token=${token}`, SUBPROTOCOLS);
+        ws.binaryType = 'arraybuffer';
+        this.ws = ws;
+        this.setStatus('connecting');
+
+        ws.onopen = () => {
+            console.log('WebSocket connected');
+            this.clearReconnect();
+            // Rooms subscribed while the socket was down
+            this.listeners.forEach((_, stream) => {
+                if (stream !== NOTIFICATIONS) {
+                    this.send({ type: 'subscribe', room_id: stream });
+                }
+            });
+            this.stopHeartbeat();
+            this.heartbeatInterval = window.setInterval(() => {
+                this.send({ type: 'heartbeat' });
+            }, HEARTBEAT_INTERVAL);
+            this.setStatus('open');
+        };
+
+        ws.onmessage = (event) => {
+            const data = typeof event.data === 'string'
+                ? JSON.parse(event.data)
+                : decode(new Uint8Array(event.data));
+            if (data.stream === undefined) {
+                this.listeners.forEach((streamListeners) => {
+                    streamListeners.forEach((listener) => listener(data));
+                });
+            } else {
+                this.listeners.get(String(data.stream))?.forEach((listener) => listener(data));
+            }
+        };
+
+        ws.onclose = (event) => {
+            console.log('WebSocket disconnected', event.code);
+            if (this.ws === ws) this.ws = null;
+            this.stopHeartbeat();
+            this.setStatus('closed');
+            // Try to reconnect if not closed cleanly and still in use
+            if (event.code !== 1000 && this.listeners.size > 0) {
+                this.clearReconnect();
+                this.reconnectTimeout = window.setTimeout(() => this.open(), RECONNECT_DELAY);
+            }
+        };
+
+        ws.onerror = (error) => {
+            console.error('WebSocket error', error);
+            ws.close();
+        };
+    }
+
+    private close() {
+        this.clearReconnect();
+        this.stopHeartbeat();
+        if (this.ws) {
+            this.ws.close(1000); // Clean close
+            this.ws = null;
+        }
+    }
+
+    private stopHeartbeat() {
+        if (this.heartbeatInterval) {
+            clearInterval(this.heartbeatInterval);
+            this.heartbeatInterval = null;
+        }
+    }
+
+    private clearReconnect() {
+        if (this.reconnectTimeout) {
+            clearTimeout(this.reconnectTimeout);
+            this.reconnectTimeout = null;
+        }
+    }
+}
+
+export const socket = new MultiplexSocket();
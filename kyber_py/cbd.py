@@ -0,0 +1,63 @@
+"""
+Centered binomial sampling, bit-sliced over PRF output.
+
+Coefficient i of a CBD_eta polynomial is the popcount difference of the
+two eta-bit halves of bits 2 * eta * i onwards, bits taken little-endian
+within each byte. For eta = 2 that is one coefficient per nibble, low
+nibble first, the order ``rtl/primitives/cbd/cbd.sv`` writes them in: a
+64-bit squeeze word holds coefficients 0..15, and each RAM write is
+{coeff 2j+1, coeff 2j} with negatives stored as 3329 + x.
+"""
+
+import numpy as np
+
+Q = 3329
+N = 256
+
+
+def _eta2_coefficients(data):
+    words = np.frombuffer(data, "<u4").astype(np.int64)
+    # Per nibble: bits (0, 1) and (2, 3) summed into 2-bit fields
+    t = (words & 0x55555555) + (words >> 1 & 0x55555555)
+    shifts = np.arange(0, 32, 4)
+    return (t[:, None] >> shifts & 3) - (t[:, None] >> (shifts + 2) & 3)
+
+
+def cbd_eta2(data):
+    """CBD_2 over 128-byte blocks; returns an (n, 256) int64 array."""
+    return _eta2_coefficients(data).reshape(-1, N)
+
+
+def cbd_eta3(data):
+    """CBD_3 over 192-byte blocks; returns an (n, 256) int64 array."""
+    b = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int64)
+    words = b[:, 0] | b[:, 1] << 8 | b[:, 2] << 16
+    # Per 6 bits: bits (0, 1, 2) and (3, 4, 5) summed into 3-bit fields
+    t = (words & 0x249249) + (words >> 1 & 0x249249) + (words >> 2 & 0x249249)
+    shifts = np.arange(0, 24, 6)
+    coeffs = (t[:, None] >> shifts & 7) - (t[:, None] >> (shifts + 3) & 7)
+    return coeffs.reshape(-1, N)
+
+
+def centered_binomial(data, eta):
+    """CBD samples from 64 * eta bytes (or uint8 array) per polynomial."""
+    if eta == 2:
+        return cbd_eta2(data)
+    if eta == 3:
+        return cbd_eta3(data)
+    raise ValueError(f"Unsupported eta {eta}")
+
+
+def to_rtl_words(coeffs):
+    """Pack coefficients two per 32-bit word as the cbd unit writes RAM."""
+    c = np.asarray(coeffs, np.int64).reshape(-1, 2) % Q
+    return (c[:, 1] << 16 | c[:, 0]).astype(np.uint32)
+
+
+def rtl_cbd(squeeze_words):
+    """
+    RAM words the cbd unit produces for a sequence of 64-bit squeeze
+    words, eight per input word.
+    """
+    data = np.asarray(squeeze_words, "<u8").tobytes()
+    return to_rtl_words(_eta2_coefficients(data))
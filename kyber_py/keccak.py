@@ -0,0 +1,191 @@
+"""
+Multi-lane Keccak-f[1600] in NumPy.
+
+``hashlib`` hashes one stream per call. Here a batch of independent sponge
+states is permuted together, one uint64 array row per lane, so the many
+short SHAKE streams of a batch of keygens or encapsulations cost one
+permutation pass per block for the whole batch.
+
+``rtl_squeeze`` models the ``keccak_sponge`` RTL as driven over the bus and
+is the golden model for ``sim/verilator/test_sponge.py``.
+"""
+
+import numpy as np
+
+ROUND_CONSTANTS = np.array(
+    [
+        0x0000000000000001,
+        0x0000000000008082,
+        0x800000000000808A,
+        0x8000000080008000,
+        0x000000000000808B,
+        0x0000000080000001,
+        0x8000000080008081,
+        0x8000000000008009,
+        0x000000000000008A,
+        0x0000000000000088,
+        0x0000000080008009,
+        0x000000008000000A,
+        0x000000008000808B,
+        0x800000000000008B,
+        0x8000000000008089,
+        0x8000000000008003,
+        0x8000000000008002,
+        0x8000000000000080,
+        0x000000000000800A,
+        0x800000008000000A,
+        0x8000000080008081,
+        0x8000000000008080,
+        0x0000000080000001,
+        0x8000000080008008,
+    ],
+    np.uint64,
+)
+
+# Rotation offsets r[x][y]
+_ROTATIONS = [
+    [0, 36, 3, 41, 18],
+    [1, 44, 10, 45, 2],
+    [62, 6, 43, 15, 61],
+    [28, 55, 25, 21, 56],
+    [27, 20, 39, 8, 14],
+]
+
+# Lanes are indexed x + 5 * y. Rho and pi together move lane (x, y),
+# rotated by r[x][y], to lane (y, 2x + 3y).
+_PI_SOURCE = np.empty(25, np.intp)
+_RHO_SHIFT = np.empty((25, 1), np.uint64)
+for _x in range(5):
+    for _y in range(5):
+        _target = _y + 5 * ((2 * _x + 3 * _y) % 5)
+        _PI_SOURCE[_target] = _x + 5 * _y
+        _RHO_SHIFT[_target] = _ROTATIONS[_x][_y]
+# A zero rotation becomes (a << 0) | (a >> 0), which is still a
+_RHO_BACK = (np.uint64(64) - _RHO_SHIFT) % np.uint64(64)
+
+# Neighbour lanes along x for theta and chi
+_PREV = np.array([4, 0, 1, 2, 3])
+_NEXT = np.array([1, 2, 3, 4, 0])
+_NEXT2 = np.array([2, 3, 4, 0, 1])
+
+_ONE = np.uint64(1)
+_63 = np.uint64(63)
+
+
+def keccak_f1600(lanes):
+    """
+    Permute a C-contiguous (25, batch) uint64 array of states in place.
+    Column b is state b, with lane (x, y) in row x + 5 * y.
+    """
+    grid = lanes.reshape(5, 5, -1)  # [y, x, batch], a view
+    b = np.empty_like(lanes)
+    t = np.empty_like(lanes)
+    b_grid = b.reshape(5, 5, -1)
+    t_grid = t.reshape(5, 5, -1)
+    for rc in ROUND_CONSTANTS:
+        # Theta
+        c = grid[0] ^ grid[1]
+        c ^= grid[2]
+        c ^= grid[3]
+        c ^= grid[4]
+        c_next = c[_NEXT]
+        d = c[_PREV]
+        d ^= c_next << _ONE | c_next >> _63
+        grid ^= d
+
+        # Rho and pi
+        np.take(lanes, _PI_SOURCE, axis=0, out=b)
+        np.right_shift(b, _RHO_BACK, out=t)
+        b <<= _RHO_SHIFT
+        b |= t
+
+        # Chi, along x within each row y
+        np.take(b_grid, _NEXT, axis=1, out=t_grid)
+        np.invert(t_grid, out=t_grid)
+        t_grid &= b_grid[:, _NEXT2]
+        np.bitwise_xor(b_grid, t_grid, out=grid)
+
+        # Iota
+        lanes[0] ^= rc
+    return lanes
+
+
+def sponge(messages, rate, suffix, length):
+    """
+    Keccak sponge over equal-length ``messages``, one lane per message.
+    Returns a (len(messages), length) uint8 array.
+    """
+    count = len(messages)
+    if count == 0:
+        return np.empty((0, length), np.uint8)
+    size = len(messages[0])
+    if any(len(m) != size for m in messages):
+        raise ValueError("Batched messages must all have the same length")
+
+    # Multi-rate padding with the domain suffix, for all lanes at once
+    blocks = size // rate + 1
+    padded = np.zeros((count, blocks * rate), np.uint8)
+    padded[:, :size] = np.frombuffer(b"".join(messages), np.uint8).reshape(count, size)
+    padded[:, size] = suffix
+    padded[:, -1] |= 0x80
+    words = padded.view("<u8").reshape(count, blocks, rate // 8)
+
+    lanes = np.zeros((25, count), np.uint64)
+    for block in range(blocks):
+        lanes[: rate // 8] ^= words[:, block].T
+        keccak_f1600(lanes)
+
+    out = []
+    produced = 0
+    while True:
+        out.append(lanes[: rate // 8].T.astype("<u8", order="C").view(np.uint8))
+        produced += rate
+        if produced >= length:
+            break
+        keccak_f1600(lanes)
+    return np.ascontiguousarray(np.concatenate(out, axis=1)[:, :length])
+
+
+def shake128(messages, length):
+    return sponge(messages, 168, 0x1F, length)
+
+
+def shake256(messages, length):
+    return sponge(messages, 136, 0x1F, length)
+
+
+def sha3_256(messages):
+    return sponge(messages, 136, 0x06, 32)
+
+
+def sha3_512(messages):
+    return sponge(messages, 72, 0x06, 64)
+
+
+def rtl_squeeze(words, count, rate_words=21):
+    """
+    Squeeze output of ``keccak_sponge`` after absorbing ``words`` over the
+    bus, as ``absorb_seed`` in ``sim_main.cpp`` does: each 32-bit word is
+    zero-extended and XORed into the next lane, without padding, with a
+    permutation when a block fills and on the last word. Returns the
+    first ``count`` 64-bit squeeze words; the bus reads the low 32 bits.
+    """
+    lanes = np.zeros((25, 1), np.uint64)
+    index = 0
+    for i, word in enumerate(words):
+        lanes[index] ^= np.uint64(word & 0xFFFFFFFF)
+        if i == len(words) - 1 or index == rate_words - 1:
+            keccak_f1600(lanes)
+            index = 0
+        else:
+            index += 1
+
+    out = []
+    for _ in range(count):
+        out.append(int(lanes[index, 0]))
+        if index == rate_words - 1:
+            keccak_f1600(lanes)
+            index = 0
+        else:
+            index += 1
+    return out
@@ -0,0 +1,440 @@
+"""
+Software Kyber (ML-KEM) engine for the full module-lattice parameter sets.
+
+``kyber_funcs.Kyber`` works on a single polynomial to drive the hardware
+model. This module implements the real scheme as standardised in FIPS 203:
+k x k matrices of polynomials derived from a seed, CBD noise from a PRF,
+ciphertext compression and the Fujisaki-Okamoto KEM on top.
+
+Polynomials are NumPy int64 arrays whose last axis has 256 coefficients,
+so every routine works on whole module vectors (and batches of them) at
+once. It does not load the Verilator model and can be imported without it.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+import keccak
+import ntt_tables
+from cbd import centered_binomial
+from modarith import barrett_reduce, montgomery_reduce
+
+Q = 3329
+N = 256
+ROOT = ntt_tables.ROOT_OF_UNITY
+N_INV = ntt_tables.INV_N  # 128^-1 mod Q, scaling for the 7-layer inverse NTT
+
+
+class KyberParams(NamedTuple):
+    name: str
+    k: int
+    eta1: int
+    eta2: int
+    du: int
+    dv: int
+
+
+PARAMS = {
+    "kyber512": KyberParams("kyber512", k=2, eta1=3, eta2=2, du=10, dv=4),
+    "kyber768": KyberParams("kyber768", k=3, eta1=2, eta2=2, du=10, dv=4),
+    "kyber1024": KyberParams("kyber1024", k=4, eta1=2, eta2=2, du=11, dv=5),
+}
+
+
+# zeta^BitRev7(i) for the butterflies, and the X^2 - gamma moduli of the
+# 128 degree-one factors used by base multiplication
+ZETAS = ntt_tables.ZETAS_NP
+GAMMAS = ntt_tables.GAMMAS_NP
+# Twiddles in Montgomery form, so a product is reduced by montgomery_reduce
+_ZETAS_MONT32 = ntt_tables.ZETAS_MONT_NP.astype(np.int32)
+
+
+# NTT
+
+
+def ntt(f):
+    """Forward NTT over the last axis; output in bit-reversed order."""
+    # Lazy reduction: twiddle products are Montgomery-reduced into (-Q, Q)
+    # and sums are left alone, so each layer adds less than Q in magnitude.
+    # int32 coefficients stay below 8 * Q, and products below Q * 2^15 as
+    # montgomery_reduce needs; [0, Q) is restored once at the end.
+    f = (np.asarray(f) % Q).astype(np.int32)
+    shape = f.shape
+    length = 128
+    while length >= 2:
+        groups = N // (2 * length)
+        f = f.reshape(*shape[:-1], groups, 2, length)
+        zetas = _ZETAS_MONT32[groups : 2 * groups, None]
+        t = montgomery_reduce(zetas * f[..., 1, :])
+        f[..., 1, :] = f[..., 0, :] - t
+        f[..., 0, :] += t
+        length //= 2
+    return (f.reshape(shape) % Q).astype(np.int64)
+
+
+def intt(f):
+    """Inverse of ``ntt``, including the 1/128 scaling."""
+    # Differences are reduced by the Montgomery twiddle product. Sums
+    # double every layer and are Barrett-reduced to within Q / 2 every
+    # third layer, before they reach 8 * Q; that keeps the differences
+    # below 8 * Q too, so their twiddle products stay below Q * 2^15.
+    f = (np.asarray(f) % Q).astype(np.int32)
+    shape = f.shape
+    length = 2
+    while length <= 128:
+        groups = N // (2 * length)
+        f = f.reshape(*shape[:-1], groups, 2, length)
+        zetas = _ZETAS_MONT32[groups : 2 * groups][::-1, None]
+        t = f[..., 0, :].copy()
+        f[..., 0, :] += f[..., 1, :]
+        if length in (8, 64):
+            f[..., 0, :] = barrett_reduce(f[..., 0, :])
+        f[..., 1, :] = montgomery_reduce(zetas * (f[..., 1, :] - t))
+        length *= 2
+    return (f.reshape(shape) * N_INV % Q).astype(np.int64)
+
+
+def multiply_ntts(a, b):
+    """Coefficient-pair products in the NTT domain, broadcasting like ``*``."""
+    a0, a1 = a[..., 0::2], a[..., 1::2]
+    b0, b1 = b[..., 0::2], b[..., 1::2]
+    c = np.empty(np.broadcast_shapes(a.shape, b.shape), np.int64)
+    c[..., 0::2] = (a0 * b0 + (a1 * b1 % Q) * GAMMAS) % Q
+    c[..., 1::2] = (a0 * b1 + a1 * b0) % Q
+    return c
+
+
+def matrix_vector(a_hat, v_hat):
+    """
+    ``a_hat @ v_hat`` for an (..., rows, k, 256) matrix and (..., k, 256)
+    vectors, in one multiply-accumulate pass over every entry.
+    """
+    return multiply_ntts(a_hat, v_hat[..., None, :, :]).sum(axis=-2) % Q
+
+
+# Encoding and compression
+
+
+def compress(x, d):
+    return ((x.astype(np.int64) << d) + Q // 2) // Q & ((1 << d) - 1)
+
+
+def decompress(y, d):
+    return (y.astype(np.int64) * Q + (1 << (d - 1))) >> d
+
+
+def byte_encode(f, d):
+    """Pack d-bit coefficients little-endian, 32 * d bytes per polynomial."""
+    bits = (f[..., None] >> np.arange(d)) & 1
+    bits = bits.reshape(*f.shape[:-1], N * d).astype(np.uint8)
+    return np.packbits(bits, axis=-1, bitorder="little")
+
+
+def byte_decode(data, d, count=1):
+    """Inverse of ``byte_encode`` for ``count`` polynomials."""
+    data = np.frombuffer(data, np.uint8).reshape(count, 32 * d)
+    bits = np.unpackbits(data, axis=-1, bitorder="little").reshape(count, N, d)
+    f = bits.astype(np.int64) @ (1 << np.arange(d))
+    return f % Q if d == 12 else f
+
+
+# Sampling
+
+
+def _candidates(stream):
+    """12-bit rejection-sampling candidates, two per 3 bytes of XOF output."""
+    b = stream.reshape(*stream.shape[:-1], -1, 3).astype(np.int64)
+    d1 = b[..., 0] | (b[..., 1] & 0x0F) << 8
+    d2 = b[..., 1] >> 4 | b[..., 2] << 4
+    return np.stack([d1, d2], axis=-1).reshape(*stream.shape[:-1], -1)
+
+
+def sample_ntt(seed):
+    """Rejection-sample one NTT-domain polynomial from SHAKE128(seed)."""
+    length = 3 * 168  # three rate blocks cover 256 coefficients almost always
+    while True:
+        stream = np.frombuffer(hashlib.shake_128(seed).digest(length), np.uint8)
+        candidates = _candidates(stream)
+        accepted = candidates[candidates < Q]
+        if len(accepted) >= N:
+            return accepted[:N]
+        length += 168
+
+
+def sample_ntt_many(seeds):
+    """``sample_ntt`` for many seeds, with the SHAKE128 lanes run together."""
+    out = np.empty((len(seeds), N), np.int64)
+    pending = np.arange(len(seeds))
+    length = 3 * 168
+    while len(pending):
+        candidates = _candidates(keccak.shake128([seeds[i] for i in pending], length))
+        valid = candidates < Q
+        done = valid.sum(axis=1) >= N
+        # The first N valid candidates of each finished lane
+        take = valid[done] & (np.cumsum(valid[done], axis=1) <= N)
+        out[pending[done]] = candidates[done][take].reshape(-1, N)
+        # The few lanes that came up short retry with a longer stream
+        pending = pending[~done]
+        length += 168
+    return out
+
+
+def gen_matrix(rho, k):
+    """The NTT-domain public matrix A, entry (i, j) from SHAKE128(rho||j||i)."""
+    a_hat = np.empty((k, k, N), np.int64)
+    for i in range(k):
+        for j in range(k):
+            a_hat[i, j] = sample_ntt(rho + bytes([j, i]))
+    return a_hat
+
+
+def gen_matrices(rhos, k):
+    """``gen_matrix`` for many seeds at once, shaped (len(rhos), k, k, 256)."""
+    seeds = [rho + bytes([j, i]) for rho in rhos for i in range(k) for j in range(k)]
+    return sample_ntt_many(seeds).reshape(len(rhos), k, k, N)
+
+
+class MatrixCache:
+    """
+    Bounded LRU cache of NTT-domain matrices A, keyed by the seed rho.
+
+    Expanding A is k^2 SHAKE128 streams with rejection sampling, the
+    largest cost of an encapsulation. A server encrypting to the same few
+    public keys expands each matrix once. Cached matrices are read-only.
+    """
+
+    MAX_ENTRIES = 64
+
+    def __init__(self, k):
+        self.k = k
+        self.lock = threading.Lock()
+        self._matrices = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rho):
+        with self.lock:
+            a_hat = self._matrices.get(rho)
+            if a_hat is not None:
+                self._matrices.move_to_end(rho)
+                self.hits += 1
+                return a_hat
+            self.misses += 1
+
+        # Expanded outside the lock; a concurrent miss just does it twice
+        a_hat = gen_matrix(rho, self.k)
+        a_hat.flags.writeable = False
+        with self.lock:
+            self._matrices[rho] = a_hat
+            self._matrices.move_to_end(rho)
+            while len(self._matrices) > self.MAX_ENTRIES:
+                self._matrices.popitem(last=False)
+        return a_hat
+
+    def clear(self):
+        with self.lock:
+            self._matrices.clear()
+
+
+def prf(seed, nonce, eta):
+    return hashlib.shake_256(seed + bytes([nonce])).digest(64 * eta)
+
+
+def sample_noise(seed, nonce, eta, count):
+    """``count`` CBD polynomials for consecutive nonces from ``nonce``."""
+    data = b"".join(prf(seed, nonce + i, eta) for i in range(count))
+    return centered_binomial(data, eta)
+
+
+def sample_noise_many(seeds, nonce, eta, count):
+    """``sample_noise`` for many seeds, shaped (len(seeds), count, 256)."""
+    messages = [seed + bytes([nonce + i]) for seed in seeds for i in range(count)]
+    data = keccak.shake256(messages, 64 * eta)
+    return centered_binomial(data, eta).reshape(len(seeds), count, N)
+
+
+# Hashes
+
+
+def G(data):
+    digest = hashlib.sha3_512(data).digest()
+    return digest[:32], digest[32:]
+
+
+def H(data):
+    return hashlib.sha3_256(data).digest()
+
+
+def J(data):
+    return hashlib.shake_256(data).digest(32)
+
+
+class KyberEngine:
+    """
+    ML-KEM for one parameter set.
+
+    ``keygen`` returns ``(ek, dk)``, ``encaps(ek)`` returns ``(key, c)``
+    and ``decaps(dk, c)`` returns the 32-byte shared key. The ``pke_*``
+    methods are the underlying CPA-secure public-key encryption of 32-byte
+    messages.
+
+    ``keygen_many`` and ``encaps_many`` do a whole batch at once: every
+    hash runs as one lane of the multi-lane ``keccak`` model and the
+    lattice arithmetic runs on (batch, k, 256) arrays.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.k = params.k
+        self.ek_size = 384 * self.k + 32
+        self.dk_size = 768 * self.k + 96
+        self.ciphertext_size = 32 * (params.du * self.k + params.dv)
+        self.matrices = MatrixCache(self.k)
+
+    # K-PKE
+
+    def _keygen_arrays(self, a_hat, s, e):
+        # Encoded (..., 384 * k) t and s; any leading axes are a batch
+        s_hat = ntt(s)
+        t_hat = (matrix_vector(a_hat, s_hat) + ntt(e)) % Q
+        batch = s.shape[:-2]
+        return (
+            byte_encode(t_hat, 12).reshape(*batch, -1),
+            byte_encode(s_hat, 12).reshape(*batch, -1),
+        )
+
+    def _encrypt_arrays(self, t_hat, a_hat, y, e1, e2, mu):
+        # Encoded (..., ciphertext_size) ciphertexts; any leading axes of
+        # the noise are a batch of encryptions to the same key
+        k, params = self.k, self.params
+
+        # A^T and t^T stacked: u and v come out of one k x k (+1 row)
+        # multiply-accumulate pass and one batched inverse NTT
+        rows = np.concatenate([a_hat.swapaxes(0, 1), t_hat[None]])
+        uv = intt(matrix_vector(rows, ntt(y)))
+
+        u = (uv[..., :k, :] + e1) % Q
+        v = (uv[..., k, :] + e2 + mu) % Q
+
+        c2 = byte_encode(compress(v, params.dv), params.dv)
+        c1 = byte_encode(compress(u, params.du), params.du).reshape(*c2.shape[:-1], -1)
+        return np.concatenate([c1, c2], axis=-1)
+
+    def pke_keygen(self, d):
+        k, eta1 = self.k, self.params.eta1
+        rho, sigma = G(d + bytes([k]))
+        # Also warms the cache for encryptions to the new key
+        a_hat = self.matrices.get(rho)
+        s = sample_noise(sigma, 0, eta1, k)
+        e = sample_noise(sigma, k, eta1, k)
+        t, s = self._keygen_arrays(a_hat, s, e)
+        return t.tobytes() + rho, s.tobytes()
+
+    def pke_encrypt(self, ek, m, r):
+        k, params = self.k, self.params
+        t_hat = byte_decode(ek[: 384 * k], 12, k)
+        a_hat = self.matrices.get(ek[384 * k :])
+
+        y = sample_noise(r, 0, params.eta1, k)
+        e1 = sample_noise(r, k, params.eta2, k)
+        e2 = sample_noise(r, 2 * k, params.eta2, 1)[0]
+        mu = decompress(byte_decode(m, 1)[0], 1)
+        return self._encrypt_arrays(t_hat, a_hat, y, e1, e2, mu).tobytes()
+
+    def pke_decrypt(self, dk, c):
+        k, params = self.k, self.params
+        split = 32 * params.du * k
+        u = decompress(byte_decode(c[:split], params.du, k), params.du)
+        v = decompress(byte_decode(c[split:], params.dv)[0], params.dv)
+        s_hat = byte_decode(dk, 12, k)
+
+        w = (v - intt(multiply_ntts(s_hat, ntt(u)).sum(axis=0))) % Q
+        return byte_encode(compress(w, 1), 1).tobytes()
+
+    # ML-KEM
+
+    def keygen(self, d=None, z=None):
+        d = os.urandom(32) if d is None else d
+        z = os.urandom(32) if z is None else z
+        ek, dk_pke = self.pke_keygen(d)
+        return ek, dk_pke + ek + H(ek) + z
+
+    def encaps(self, ek, m=None):
+        if len(ek) != self.ek_size:
+            raise ValueError(
+                f"{self.params.name} encapsulation key must be {self.ek_size} bytes"
+            )
+        m = os.urandom(32) if m is None else m
+        key, r = G(m + H(ek))
+        return key, self.pke_encrypt(ek, m, r)
+
+    def keygen_many(self, count):
+        """``count`` fresh ``(ek, dk)`` pairs."""
+        k, eta1 = self.k, self.params.eta1
+        seeds = os.urandom(64 * count)
+        ds = [seeds[64 * i : 64 * i + 32] for i in range(count)]
+        zs = [seeds[64 * i + 32 : 64 * i + 64] for i in range(count)]
+
+        g = keccak.sha3_512([d + bytes([k]) for d in ds])
+        rhos = [row.tobytes() for row in g[:, :32]]
+        sigmas = [row.tobytes() for row in g[:, 32:]]
+        # Fresh seeds would only evict useful entries from the cache
+        a_hat = gen_matrices(rhos, k)
+        noise = sample_noise_many(sigmas, 0, eta1, 2 * k)
+        t, s = self._keygen_arrays(a_hat, noise[:, :k], noise[:, k:])
+
+        eks = [t[i].tobytes() + rhos[i] for i in range(count)]
+        hs = keccak.sha3_256(eks)
+        return [
+            (ek, s[i].tobytes() + ek + hs[i].tobytes() + zs[i])
+            for i, ek in enumerate(eks)
+        ]
+
+    def encaps_many(self, ek, count):
+        """``count`` independent ``(key, c)`` encapsulations to ``ek``."""
+        if len(ek) != self.ek_size:
+            raise ValueError(
+                f"{self.params.name} encapsulation key must be {self.ek_size} bytes"
+            )
+        k, params = self.k, self.params
+        seeds = os.urandom(32 * count)
+        ms = [seeds[32 * i : 32 * i + 32] for i in range(count)]
+
+        h = H(ek)
+        g = keccak.sha3_512([m + h for m in ms])
+        keys = [row.tobytes() for row in g[:, :32]]
+        rs = [row.tobytes() for row in g[:, 32:]]
+
+        t_hat = byte_decode(ek[: 384 * k], 12, k)
+        a_hat = self.matrices.get(ek[384 * k :])
+        y = sample_noise_many(rs, 0, params.eta1, k)
+        e = sample_noise_many(rs, k, params.eta2, k + 1)
+        mu = decompress(byte_decode(seeds, 1, count), 1)
+        c = self._encrypt_arrays(t_hat, a_hat, y, e[:, :k], e[:, k], mu)
+        return [(keys[i], c[i].tobytes()) for i in range(count)]
+
+    def decaps(self, dk, c):
+        if len(dk) != self.dk_size or len(c) != self.ciphertext_size:
+            raise ValueError(f"Malformed {self.params.name} key or ciphertext")
+        k = self.k
+        dk_pke = dk[: 384 * k]
+        ek = dk[384 * k : 768 * k + 32]
+        h = dk[768 * k + 32 : 768 * k + 64]
+        z = dk[768 * k + 64 :]
+
+        m = self.pke_decrypt(dk_pke, c)
+        key, r = G(m + h)
+        # Implicit rejection: a tampered ciphertext yields an unrelated key
+        if not hmac.compare_digest(self.pke_encrypt(ek, m, r), c):
+            return J(z + c)
+        return key
+
+
+# Global instances
+engines = {name: KyberEngine(params) for name, params in PARAMS.items()}
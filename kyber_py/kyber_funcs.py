@@ -1,7 +1,14 @@
 import ctypes
+import hashlib
 import os
 import time
 import random
+import threading
+from collections import deque
+
+import numpy as np
+
+from cbd import centered_binomial
 
 
 def bit_reverse(n, bits=8):
@@ -20,38 +27,38 @@ class KyberNTT:
         for i in range(1, self.n):
             self.zetas[i] = (self.zetas[i - 1] * self.root) % self.q
 
+        # DFT matrices: entry (k, i) is w^(ik), and w^256 = 1. A row sum of
+        # 256 products below q^2 stays under 2^53, so a float64 (BLAS)
+        # product is exact and one reduction at the end suffices.
+        powers = np.array(self.zetas, np.float64)
+        exponents = np.outer(np.arange(self.n), np.arange(self.n))
+        self.forward = powers[exponents % self.n]
+        self.inverse = powers[-exponents % self.n]
+        self.inv_n = pow(self.n, self.q - 2, self.q)
+
+        # Polynomials transformed so far, for per-operation reports
+        self.counts = {"ntt": 0, "intt": 0}
+
+    def _transform(self, matrix, poly, kind):
+        # One polynomial, or a stack with one per row. Both matrices are
+        # symmetric, so the row stack multiplies from the left.
+        poly = np.asarray(poly, np.int64) % self.q
+        self.counts[kind] += poly.size // self.n
+        return (poly @ matrix).astype(np.int64) % self.q
+
+    def ntt_array(self, poly):
+        # Plain DFT, standard order in and out, as a matrix product
+        return self._transform(self.forward, poly, "ntt")
+
+    def intt_array(self, poly):
+        # Inverse DFT
+        return self._transform(self.inverse, poly, "intt") * self.inv_n % self.q
+
     def ntt(self, poly):
-        # Standard iterative NTT (BitReversed Input -> Standard Output for checking)
-        # Actually Kyber HW uses Standard -> BitReversed+Montgomery?
-        # Let's implementation simple DFT for correctness check first
-        res = [0] * self.n
-        for k in range(self.n):
-            sum_val = 0
-            w_k = 1
-            # w^k
-            w_step = pow(self.root, bit_reverse(k), self.q)  # if bitreversed?
-            # Standard DFT: sum x[i] * w^(ik)
-            w = pow(self.root, k, self.q)
-            for i in range(self.n):
-                term = (poly[i] * pow(w, i, self.q)) % self.q
-                sum_val = (sum_val + term) % self.q
-            res[k] = sum_val
-        return res
+        return self.ntt_array(poly).tolist()
 
     def intt(self, poly):
-        # Inverse DFT
-        res = [0] * self.n
-        inv_n = pow(self.n, self.q - 2, self.q)
-        inv_root = pow(self.root, self.q - 2, self.q)
-
-        for k in range(self.n):
-            sum_val = 0
-            w = pow(inv_root, k, self.q)
-            for i in range(self.n):
-                term = (poly[i] * pow(w, i, self.q)) % self.q
-                sum_val = (sum_val + term) % self.q
-            res[k] = (sum_val * inv_n) % self.q
-        return res
+        return self.intt_array(poly).tolist()
 
 
 from pathlib import Path
@@ -291,34 +298,156 @@ def poly_to_str(coeffs):
     return bytearray(chars).decode("utf-8", errors="replace")
 
 
+def sample_cbd(seed, nonce, eta=2):
+    # CBD noise from SHAKE256(seed || nonce), in cbd RTL coefficient order
+    data = hashlib.shake_256(seed + bytes([nonce])).digest(64 * eta)
+    return centered_binomial(data, eta)[0].tolist()
+
+
+class NoisePool:
+    """
+    Encryption noise (r, e1, e2) made ahead of time, in NTT form.
+
+    A worker thread keeps up to ``size`` tuples ready. It stays idle until
+    encryptions drain the pool to half, so a burst of messages is not
+    slowed by refills, then tops it up in batches of up to ``batch``. Each tuple is a
+    (3, 256) array handed out once by ``take``; the caller zeroes it after
+    use. ``take`` returns None when the pool is empty, and the caller then
+    samples inline as before.
+    """
+
+    def __init__(self, size=64, batch=16):
+        self.size = size
+        self.batch = batch
+        # Own transform counts, apart from the request path
+        self.ntt = KyberNTT()
+        self.cond = threading.Condition()
+        self.ready = deque()
+        self.hits = 0
+        self.misses = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+            # Unused noise is wiped as well
+            while self.ready:
+                self.ready.popleft().fill(0)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _sample(self, count):
+        noise = []
+        for _ in range(count):
+            seed = os.urandom(32)
+            noise.append([sample_cbd(seed, nonce) for nonce in range(3)])
+        # One batched transform for all 3 * count polynomials
+        return self.ntt.ntt_array(noise)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                # Idle until drained to half, then fill all the way up
+                while self.running and len(self.ready) > self.size // 2:
+                    self.cond.wait()
+            while True:
+                with self.cond:
+                    if not self.running:
+                        return
+                    count = min(self.batch, self.size - len(self.ready))
+                if count <= 0:
+                    break
+                # Sample outside the lock so take() never waits on it
+                noise = self._sample(count)
+                with self.cond:
+                    if not self.running:
+                        noise.fill(0)
+                        return
+                    self.ready.extend(noise)
+
+    def take(self):
+        with self.cond:
+            if not self.ready:
+                self.misses += 1
+                return None
+            self.hits += 1
+            noise = self.ready.popleft()
+            self.cond.notify()
+        return noise
+
+
 hw = KyberHW()
 
 
 class Kyber:
-    def __init__(self, hw_interface):
+    def __init__(self, hw_interface, noise_pool=None):
         self.hw = hw_interface
+        # Optional NoisePool of precomputed encryption noise
+        self.noise_pool = noise_pool
         self.pk = None
         self.sk = None
         self.a_matrix = None
+        # NTT and INTT counts of the last keygen, encrypt and decrypt
+        self.transforms = {}
+        self._arrays = {}
+
+    def _operand(self, key, sources, build):
+        # pk, sk and A are lists in NTT form (that is how they are pickled);
+        # the arrays built from them are kept until the attributes change
+        cached = self._arrays.get(key)
+        if cached is None or any(a is not b for a, b in zip(cached[0], sources)):
+            cached = self._arrays[key] = (sources, build(*sources))
+        return cached[1]
+
+    def _public_operands(self):
+        # [A; t], so u and v come out of one multiply-accumulate
+        return self._operand(
+            "public",
+            (self.a_matrix, self.pk),
+            lambda a, pk: np.array([a, pk], np.int64) % 3329,
+        )
+
+    def _secret_operand(self):
+        return self._operand(
+            "secret", (self.sk,), lambda sk: np.array(sk, np.int64) % 3329
+        )
+
+    def _report(self, op, before):
+        counts = {kind: py_ntt.counts[kind] - before[kind] for kind in before}
+        self.transforms[op] = counts
+        print(f"{op}: {counts['ntt']} NTT, {counts['intt']} INTT")
 
     def keygen(self):
         print("\n--- Kyber KeyGen (Hybrid) ---")
+        before = dict(py_ntt.counts)
         # SW KeyGen (Golden)
-        s_sw = [random.randint(0, 4) - 2 for _ in range(256)]
-        e_sw = [random.randint(0, 4) - 2 for _ in range(256)]
-        a_sw = [random.randint(0, 3328) for _ in range(256)]
+        sigma = os.urandom(32)
+        s_sw = sample_cbd(sigma, 0)
+        e_sw = sample_cbd(sigma, 1)
+        # A is uniform, and so is its transform: sample it in NTT form
+        a_ntt = [random.randint(0, 3328) for _ in range(256)]
 
-        s_ntt = py_ntt.ntt(s_sw)
-        e_ntt = py_ntt.ntt(e_sw)
-        a_ntt = py_ntt.ntt(a_sw)
-        t_ntt = [(a * s + e) % 3329 for a, s, e in zip(a_ntt, s_ntt, e_ntt)]
+        s_ntt, e_ntt = py_ntt.ntt_array([s_sw, e_sw])
+        t_ntt = (np.array(a_ntt) * s_ntt + e_ntt) % 3329
 
-        self.pk = t_ntt
-        self.sk = s_ntt
+        self.pk = t_ntt.tolist()
+        self.sk = s_ntt.tolist()
         self.a_matrix = a_ntt  # Store for encrypt
 
         # Trigger HW
         self.hw.run_gen_key(0x1234)
+        self._report("keygen", before)
         print("Keys Generated.")
         return self.pk, self.sk
 
@@ -327,49 +456,59 @@ class Kyber:
             raise Exception("Keys not generated")
 
         print("\n--- Kyber Encrypt (Hybrid) ---")
+        before = dict(py_ntt.counts)
         # SW Encrypt
-        r = [random.randint(0, 4) - 2 for _ in range(256)]
-        e1 = [random.randint(0, 4) - 2 for _ in range(256)]
-        e2 = [random.randint(0, 4) - 2 for _ in range(256)]
         m_poly = str_to_poly(msg)
-
-        r_ntt = py_ntt.ntt(r)
-        e1_ntt = py_ntt.ntt(e1)
-
-        # Use stored A matrix
-        u_ntt = [
-            (a * r_val + e) % 3329 for a, r_val, e in zip(self.a_matrix, r_ntt, e1_ntt)
-        ]
-
-        v_pre = [(p * r_val) % 3329 for p, r_val in zip(self.pk, r_ntt)]
-        e2_m = [(e + m) % 3329 for e, m in zip(e2, m_poly)]
-        e2_m_ntt = py_ntt.ntt(e2_m)
-        v_ntt = [(v + e) % 3329 for v, e in zip(v_pre, e2_m_ntt)]
-
-        # Trigger HW
-        # Load inputs to generate generic activity
-        self.hw.write_mem(0, r_ntt)
-        self.hw.write_mem(128, coeffs_to_words(self.a_matrix))
-        self.hw.run_mul_acc()
-
+        transformed = self.noise_pool.take() if self.noise_pool else None
+        # The noise is single-use; wipe it however the encryption ends
+        try:
+            if transformed is None:
+                seed = os.urandom(32)
+                r = sample_cbd(seed, 0)
+                e1 = sample_cbd(seed, 1)
+                e2 = sample_cbd(seed, 2)
+
+                # Only r, e1 and e2 + m enter in the normal domain; e2 and m
+                # are added first, and the three go through one batched
+                # transform
+                transformed = py_ntt.ntt_array([r, e1, np.add(e2, m_poly)])
+            else:
+                # Pooled r, e1 and e2 are already transformed; only m is left
+                transformed[2] += py_ntt.ntt_array(m_poly)
+            r_ntt = transformed[0]
+
+            # u = A r + e1 and v = t r + (e2 + m), fused, using stored A and t
+            u_ntt, v_ntt = (self._public_operands() * r_ntt + transformed[1:]) % 3329
+
+            # Trigger HW
+            # Load inputs to generate generic activity
+            self.hw.write_mem(0, r_ntt.tolist())
+            self.hw.write_mem(128, coeffs_to_words(self.a_matrix))
+            self.hw.run_mul_acc()
+        finally:
+            if transformed is not None:
+                transformed.fill(0)
+
+        self._report("encrypt", before)
         print("Encryption Done.")
-        return u_ntt, v_ntt
+        return u_ntt.tolist(), v_ntt.tolist()
 
     def decrypt(self, u_ntt, v_ntt):
         if self.sk is None:
             raise Exception("Keys not generated")
 
         print("\n--- Kyber Decrypt (Hybrid) ---")
-        # SW Decrypt
-        s_u = [(s * u_val) % 3329 for s, u_val in zip(self.sk, u_ntt)]
-        dim_m_ntt = [(v_val - su_val) % 3329 for v_val, su_val in zip(v_ntt, s_u)]
+        before = dict(py_ntt.counts)
+        # SW Decrypt: v - s u stays in NTT form, one inverse transform
+        dim_m_ntt = np.subtract(v_ntt, self._secret_operand() * np.asarray(u_ntt))
 
-        m_raw = py_ntt.intt(dim_m_ntt)
+        m_raw = py_ntt.intt_array(dim_m_ntt).tolist()
 
         # Trigger HW
         self.hw.run_mul_acc()
         self.hw.run_ntt(0, inverse=True)
 
+        self._report("decrypt", before)
         out_msg = poly_to_str(m_raw)
         print(f"Decrypted Message: {out_msg}")
         return out_msg
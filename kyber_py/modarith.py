@@ -0,0 +1,71 @@
+"""
+Modular arithmetic mod q = 3329, shared by the Python models.
+
+Every function is written with plain integer operators, so it takes
+Python ints and NumPy integer arrays alike. ``hw_mul`` and ``hw_add_sub``
+are bit-exact models of ``rtl/primitives/ntt/ntt_mul.sv`` and
+``modular_add_sub.sv``. ``montgomery_reduce`` and ``barrett_reduce``
+return non-canonical representatives, for NTTs that reduce lazily and
+only bring values back into [0, q) at the end.
+"""
+
+Q = 3329
+R_BITS = 16
+QINV = -3327  # -q^-1 mod 2^16, as a signed 16-bit value
+MONT_R = (1 << R_BITS) % Q  # 2285, 1 in Montgomery form
+MONT_R2 = MONT_R * MONT_R % Q  # 1353, converts into Montgomery form
+BARRETT_V = ((1 << 26) + Q // 2) // Q  # 20159
+
+
+def bit_reverse(n, bits):
+    result = 0
+    for _ in range(bits):
+        result = (result << 1) | (n & 1)
+        n >>= 1
+    return result
+
+
+def mod_inverse(a):
+    return pow(a, -1, Q)
+
+
+def to_signed16(a):
+    """Reinterpret the low 16 bits as a signed value."""
+    return ((a + 0x8000) & 0xFFFF) - 0x8000
+
+
+def montgomery_reduce(a):
+    """
+    a * 2^-16 mod q, in (-q, q) for |a| < q * 2^15. With int32 arrays the
+    product with QINV may wrap, which leaves the low 16 bits intact.
+    """
+    m = to_signed16(a * QINV)
+    return (a - m * Q) >> R_BITS
+
+
+def barrett_reduce(a):
+    """A representative of a mod q in [-(q - 1) / 2, (q - 1) / 2], |a| < 2^15."""
+    t = (BARRETT_V * a + (1 << 25)) >> 26
+    return a - t * Q
+
+
+def to_montgomery(a):
+    return a * MONT_R % Q
+
+
+def hw_mul(a, b):
+    """``ntt_mul``: Montgomery product of two 16-bit signed inputs,
+    corrected once into [0, q), as a 16-bit value."""
+    product = to_signed16(a) * to_signed16(b)
+    res = to_signed16(montgomery_reduce(product))
+    res = res - Q * (res >= Q) + Q * (res < 0)
+    return res & 0xFFFF
+
+
+def hw_add_sub(a, b):
+    """``modular_add_sub``: (a + b) mod q and (a - b) mod q of 16-bit
+    unsigned inputs in [0, q), each corrected once."""
+    raw_sum = a + b
+    total = (raw_sum - Q * (raw_sum >= Q)) & 0xFFFF
+    diff = (a - b + Q * (a < b)) & 0xFFFF
+    return total, diff
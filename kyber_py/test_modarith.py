@@ -0,0 +1,105 @@
+"""
+Lazy reductions and the engine NTTs against plain ``%`` arithmetic.
+
+    python3 -m unittest discover -s kyber_py
+"""
+
+import unittest
+
+import numpy as np
+
+import kyber_engine
+from modarith import MONT_R, Q, barrett_reduce, montgomery_reduce, to_montgomery
+from ntt_tables import ZETAS
+
+
+def reference_ntt(f):
+    """FIPS 203 Algorithm 9, one polynomial, reducing after every step."""
+    f = [int(x) % Q for x in f]
+    k = 1
+    length = 128
+    while length >= 2:
+        for start in range(0, 256, 2 * length):
+            zeta = ZETAS[k]
+            k += 1
+            for j in range(start, start + length):
+                t = zeta * f[j + length] % Q
+                f[j + length] = (f[j] - t) % Q
+                f[j] = (f[j] + t) % Q
+        length //= 2
+    return f
+
+
+def reference_intt(f):
+    """FIPS 203 Algorithm 10, one polynomial, reducing after every step."""
+    f = [int(x) % Q for x in f]
+    k = 127
+    length = 2
+    while length <= 128:
+        for start in range(0, 256, 2 * length):
+            zeta = ZETAS[k]
+            k -= 1
+            for j in range(start, start + length):
+                t = f[j]
+                f[j] = (t + f[j + length]) % Q
+                f[j + length] = zeta * (f[j + length] - t) % Q
+        length *= 2
+    return [x * 3303 % Q for x in f]
+
+
+class ReductionTests(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_montgomery_reduce(self):
+        bound = Q << 15
+        values = self.rng.integers(-bound + 1, bound, 100_000)
+        for a in (values, values.astype(np.int32)):
+            reduced = montgomery_reduce(a)
+            self.assertTrue((np.abs(reduced) < Q).all())
+            self.assertTrue(((reduced * MONT_R - a) % Q == 0).all())
+        for a in values[:1000].tolist():
+            self.assertEqual(montgomery_reduce(a) * MONT_R % Q, a % Q)
+
+    def test_montgomery_product(self):
+        a = self.rng.integers(0, Q, 10_000)
+        b = self.rng.integers(-8 * Q + 1, 8 * Q, 10_000)
+        product = montgomery_reduce(to_montgomery(a) * b)
+        self.assertTrue((product % Q == a * b % Q).all())
+
+    def test_barrett_reduce(self):
+        values = np.arange(-(1 << 15) + 1, 1 << 15)
+        for a in (values, values.astype(np.int32)):
+            reduced = barrett_reduce(a)
+            self.assertTrue((np.abs(reduced) <= Q // 2).all())
+            self.assertTrue(((reduced - a) % Q == 0).all())
+        for a in values[::97].tolist():
+            self.assertEqual(barrett_reduce(a) % Q, a % Q)
+
+
+class EngineNttTests(unittest.TestCase):
+    def setUp(self):
+        self.polys = np.random.default_rng(1).integers(0, Q, (4, 256))
+
+    def test_ntt_matches_reference(self):
+        expected = [reference_ntt(p) for p in self.polys]
+        self.assertEqual(kyber_engine.ntt(self.polys).tolist(), expected)
+
+    def test_intt_matches_reference(self):
+        expected = [reference_intt(p) for p in self.polys]
+        self.assertEqual(kyber_engine.intt(self.polys).tolist(), expected)
+
+    def test_worst_case_inputs(self):
+        # All coefficients at Q - 1 push the lazy sums to their bounds
+        for f in (np.full((1, 256), Q - 1), np.zeros((1, 256), np.int64)):
+            self.assertEqual(kyber_engine.ntt(f).tolist(), [reference_ntt(f[0])])
+            self.assertEqual(kyber_engine.intt(f).tolist(), [reference_intt(f[0])])
+
+    def test_round_trip_batches(self):
+        batch = self.polys.reshape(2, 2, 256)
+        restored = kyber_engine.intt(kyber_engine.ntt(batch))
+        self.assertTrue((restored == batch).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,10 @@
+// Generated by scripts/gen_ntt_rom.py. Do not edit.
+// inputs: 7de29c566865116b
 package ntt_rom_pkg;
+    localparam logic [15:0] Q = 16'd3329;
+    localparam logic [15:0] MONT_R = 16'd2285;
+    localparam logic [15:0] INV_N_MONT = 16'd512;
+
     // Zetas in Montgomery Domain (x * 2^16 mod 3329)
     // Order matches Cooley-Tukey processing order (k=1..127)
     function automatic logic [15:0] get_zeta(input logic [6:0] idx);
@@ -134,4 +140,140 @@ package ntt_rom_pkg;
             default: return 16'd0;
         endcase
     endfunction
+
+    // Inverse zetas in Montgomery Domain, for the Gentleman-Sande INTT
+    // Order matches Cooley-Tukey processing order (k=1..127)
+    function automatic logic [15:0] get_zeta_inv(input logic [6:0] idx);
+        case (idx)
+            7'd0: return 16'd2285;
+            7'd1: return 16'd758;
+            7'd2: return 16'd1517;
+            7'd3: return 16'd359;
+            7'd4: return 16'd3127;
+            7'd5: return 16'd3042;
+            7'd6: return 16'd1907;
+            7'd7: return 16'd1836;
+            7'd8: return 16'd1861;
+            7'd9: return 16'd1474;
+            7'd10: return 16'd1202;
+            7'd11: return 16'd2367;
+            7'd12: return 16'd3147;
+            7'd13: return 16'd1752;
+            7'd14: return 16'd2707;
+            7'd15: return 16'd171;
+            7'd16: return 16'd1571;
+            7'd17: return 16'd205;
+            7'd18: return 16'd2918;
+            7'd19: return 16'd1542;
+            7'd20: return 16'd2721;
+            7'd21: return 16'd2597;
+            7'd22: return 16'd2312;
+            7'd23: return 16'd681;
+            7'd24: return 16'd130;
+            7'd25: return 16'd1602;
+            7'd26: return 16'd1871;
+            7'd27: return 16'd829;
+            7'd28: return 16'd2946;
+            7'd29: return 16'd3065;
+            7'd30: return 16'd1325;
+            7'd31: return 16'd2756;
+            7'd32: return 16'd1275;
+            7'd33: return 16'd2652;
+            7'd34: return 16'd1065;
+            7'd35: return 16'd2881;
+            7'd36: return 16'd725;
+            7'd37: return 16'd1508;
+            7'd38: return 16'd2368;
+            7'd39: return 16'd398;
+            7'd40: return 16'd951;
+            7'd41: return 16'd247;
+            7'd42: return 16'd1421;
+            7'd43: return 16'd3222;
+            7'd44: return 16'd2499;
+            7'd45: return 16'd271;
+            7'd46: return 16'd90;
+            7'd47: return 16'd853;
+            7'd48: return 16'd1860;
+            7'd49: return 16'd3203;
+            7'd50: return 16'd1162;
+            7'd51: return 16'd1618;
+            7'd52: return 16'd666;
+            7'd53: return 16'd320;
+            7'd54: return 16'd8;
+            7'd55: return 16'd2813;
+            7'd56: return 16'd1544;
+            7'd57: return 16'd282;
+            7'd58: return 16'd1838;
+            7'd59: return 16'd1293;
+            7'd60: return 16'd2314;
+            7'd61: return 16'd552;
+            7'd62: return 16'd2677;
+            7'd63: return 16'd2106;
+            7'd64: return 16'd1701;
+            7'd65: return 16'd1807;
+            7'd66: return 16'd1460;
+            7'd67: return 16'd2371;
+            7'd68: return 16'd2338;
+            7'd69: return 16'd2333;
+            7'd70: return 16'd308;
+            7'd71: return 16'd108;
+            7'd72: return 16'd2851;
+            7'd73: return 16'd870;
+            7'd74: return 16'd854;
+            7'd75: return 16'd1510;
+            7'd76: return 16'd2535;
+            7'd77: return 16'd1278;
+            7'd78: return 16'd1530;
+            7'd79: return 16'd1185;
+            7'd80: return 16'd1659;
+            7'd81: return 16'd1187;
+            7'd82: return 16'd3109;
+            7'd83: return 16'd874;
+            7'd84: return 16'd1335;
+            7'd85: return 16'd2111;
+            7'd86: return 16'd136;
+            7'd87: return 16'd1215;
+            7'd88: return 16'd2945;
+            7'd89: return 16'd1465;
+            7'd90: return 16'd1285;
+            7'd91: return 16'd2007;
+            7'd92: return 16'd2719;
+            7'd93: return 16'd2726;
+            7'd94: return 16'd2232;
+            7'd95: return 16'd2512;
+            7'd96: return 16'd75;
+            7'd97: return 16'd156;
+            7'd98: return 16'd3000;
+            7'd99: return 16'd2911;
+            7'd100: return 16'd2980;
+            7'd101: return 16'd872;
+            7'd102: return 16'd2685;
+            7'd103: return 16'd1590;
+            7'd104: return 16'd2210;
+            7'd105: return 16'd602;
+            7'd106: return 16'd1846;
+            7'd107: return 16'd777;
+            7'd108: return 16'd147;
+            7'd109: return 16'd2170;
+            7'd110: return 16'd2551;
+            7'd111: return 16'd246;
+            7'd112: return 16'd1676;
+            7'd113: return 16'd1755;
+            7'd114: return 16'd460;
+            7'd115: return 16'd291;
+            7'd116: return 16'd235;
+            7'd117: return 16'd3152;
+            7'd118: return 16'd2742;
+            7'd119: return 16'd2907;
+            7'd120: return 16'd3224;
+            7'd121: return 16'd1779;
+            7'd122: return 16'd2458;
+            7'd123: return 16'd1251;
+            7'd124: return 16'd2486;
+            7'd125: return 16'd2774;
+            7'd126: return 16'd2899;
+            7'd127: return 16'd1103;
+            default: return 16'd0;
+        endcase
+    endfunction
 endpackage
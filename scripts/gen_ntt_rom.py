@@ -1,112 +1,216 @@
-def bit_reverse(n, width):
-    b = "{:0{width}b}".format(n, width=width)
-    return int(b[::-1], 2)
-
-
-def gen_rom():
-    q = 3329
-    root_of_unity = 17
-    # Montgomery factor 2^16 mod q
-    mont_r = (1 << 16) % q
-
-    # Pre-compute zetas
-    # Kyber Zetas are usually defined as BitRev(i) index?
-    # Or typically the table is generated such that we access it sequentially
-    # during the Cooley-Tukey butterfly.
-    # Standard Kyber loop (from ref implementation):
-    # k = 1
-    # for len in [128, 64, 32, 16, 8, 4, 2]:
-    #   for start in 0..255 step 2*len:
-    #     zeta = zetas[k]; k++
-    #     ...
-    # So we want the zetas in the order they are used.
-    # The reference 'zetas' array is 128 elements.
-
-    zetas = [0] * 128
-
-    # Generate powers of root
-    # In Kyber reference, zetas are precomputed bit-reversed.
-    # But wait, looking at ref code:
-    # zetas[i] = mont_mul(root^bitrev(i), R) ?
-    # Let's generate them simply as powers for now, but ordered correctly.
-    # Actually, to avoid confusion, let's use the explicit table generation logic from standard scripts
-    # or just simple powers if we trust our address generator to handle it.
-    # BUT, the simple CT butterfly walks k++.
-
-    # Let's calculate standard bit-reversed order zetas in Montgomery form.
-
-    def mont_mul(a, b):
-        return (
-            a * b
-        ) % q  # Python handles large ints, no need for reduction logic here strictly
-
-    # Calculate table
-    # We need 128 zetas.
-    output_vals = []
-
-    # We track the 'k' index from the reference C code logic to ensure we match order.
-    # Ref:
-    #   k = 1;
-    #   for (len = 128; len >= 2; len >>= 1) {
-    #     for (start = 0; start < 256; start += 2 * len) {
-    #        zeta = zetas[k];
-    #        ...
-    #     }
-    #     k++; (wait, k increments in the outer loop? No, usually per butterfly group)
-    #   }
-
-    # Re-reading Kyber spec / ref code (poly.c ntt):
-    # k = 1;
-    # for(len=128; len>=2; len>>=1) {
-    #   for(start=0; start<256; start+=2*len) {
-    #     zeta = zetas[k++]; // k increments here!
-    #     for(j=start; j<start+len; j++) { ... }
-    #   }
-    # }
-    # So k goes 1..127.
-
-    # We need to generate the 'zetas' array that matches this access pattern.
-    # The 'zetas' array in usage is bit-reversed powers of root.
-
-    # Let's write the SystemVerilog
-
-    sv_header = """package ntt_rom_pkg;
-    // Zetas in Montgomery Domain (x * 2^16 mod 3329)
-    // Order matches Cooley-Tukey processing order (k=1..127)
-    function automatic logic [15:0] get_zeta(input logic [6:0] idx);
-        case (idx)"""
-
-    sv_footer = """            default: return 16'd0;
-        endcase
-    endfunction
-endpackage"""
-
-    # Calculate powers
-    # root = 17
-    # mont_r = 2285
-    powers = []
-    val = 1
-    for i in range(128):
-        # Montgomery transform
-        mont_val = (val * mont_r) % q
-        powers.append(mont_val)
-        val = (val * root_of_unity) % q
-
-    # Bit reverse index
-    def br7(i):
-        # Bit reverse 7 bits
-        return int("{:07b}".format(i)[::-1], 2)
-
-    zetas_mont = [powers[br7(i)] for i in range(128)]
-
-    # We only use indices 1 to 127 in the standard loop. Index 0 is not used?
-    # Actually, let's just dump the whole 0..127 table. The HW will index it.
-
-    print(sv_header)
-    for i in range(128):
-        print(f"            7'd{i}: return 16'd{zetas_mont[i]};")
-    print(sv_footer)
+"""
+Generate the NTT twiddle tables from one source.
+
+Writes ``rtl/primitives/ntt/ntt_rom_pkg.sv`` and ``kyber_py/ntt_tables.py``
+from q, the root of unity and the Montgomery radix, using the arithmetic in
+``kyber_py/modarith.py``. Both files carry a fingerprint of those inputs
+and of this script; a file whose fingerprint matches is left alone, so the
+script can run before every build.
+
+    python3 scripts/gen_ntt_rom.py           # regenerate stale files
+    python3 scripts/gen_ntt_rom.py --force   # rewrite both
+    python3 scripts/gen_ntt_rom.py --check   # exit 1 if anything is stale
+
+``--check`` also compares the tables inlined in ``ntt_core.sv`` (kept
+there for Verilator) against the generated ones.
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+KYBER_PY_DIR = ROOT_DIR / "kyber_py"
+sys.path.insert(0, str(KYBER_PY_DIR))
+
+import modarith
+from modarith import MONT_R, MONT_R2, Q, QINV, R_BITS, bit_reverse, mod_inverse
+
+SV_PATH = ROOT_DIR / "rtl" / "primitives" / "ntt" / "ntt_rom_pkg.sv"
+PY_PATH = KYBER_PY_DIR / "ntt_tables.py"
+NTT_CORE_PATH = ROOT_DIR / "rtl" / "primitives" / "ntt" / "ntt_core.sv"
+
+N = 256
+ROOT_OF_UNITY = 17  # primitive 256th root of unity mod q
+LAYERS = 7  # 128 twiddles, indexed BitRev7
+
+
+def fingerprint():
+    h = hashlib.sha256()
+    h.update(f"{Q} {N} {ROOT_OF_UNITY} {R_BITS} {LAYERS}".encode())
+    h.update(Path(__file__).read_bytes())
+    h.update(Path(modarith.__file__).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def compute_tables():
+    count = 1 << LAYERS
+    zetas = [pow(ROOT_OF_UNITY, bit_reverse(i, LAYERS), Q) for i in range(count)]
+    zetas_mont = [z * MONT_R % Q for z in zetas]
+    inv_n = mod_inverse(count)
+    return {
+        # Twiddles in Cooley-Tukey order (k = 1..127 per butterfly group)
+        "ZETAS": zetas,
+        "ZETAS_MONT": zetas_mont,
+        # Montgomery form of zeta^-1: hw_mul(zeta_mont, zeta_inv) = MONT_R
+        "ZETAS_INV_MONT": [mod_inverse(z) * MONT_R2 % Q for z in zetas_mont],
+        # X^2 - gamma moduli of base multiplication
+        "GAMMAS": [
+            pow(ROOT_OF_UNITY, 2 * bit_reverse(i, LAYERS) + 1, Q) for i in range(count)
+        ],
+        "INV_N": inv_n,
+        # Scaling after the inverse NTT, as hw_mul takes it
+        "INV_N_MONT": inv_n * MONT_R % Q,
+    }
+
+
+def render_sv(tables, stamp):
+    lines = [
+        "// Generated by scripts/gen_ntt_rom.py. Do not edit.",
+        f"// inputs: {stamp}",
+        "package ntt_rom_pkg;",
+        f"    localparam logic [15:0] Q = 16'd{Q};",
+        f"    localparam logic [15:0] MONT_R = 16'd{MONT_R};",
+        f"    localparam logic [15:0] INV_N_MONT = 16'd{tables['INV_N_MONT']};",
+        "",
+    ]
+    functions = [
+        (
+            "get_zeta",
+            "ZETAS_MONT",
+            "Zetas in Montgomery Domain (x * 2^16 mod 3329)",
+        ),
+        (
+            "get_zeta_inv",
+            "ZETAS_INV_MONT",
+            "Inverse zetas in Montgomery Domain, for the Gentleman-Sande INTT",
+        ),
+    ]
+    for name, key, comment in functions:
+        lines += [
+            f"    // {comment}",
+            "    // Order matches Cooley-Tukey processing order (k=1..127)",
+            f"    function automatic logic [15:0] {name}(input logic [6:0] idx);",
+            "        case (idx)",
+        ]
+        lines += [
+            f"            7'd{i}: return 16'd{v};" for i, v in enumerate(tables[key])
+        ]
+        lines += [
+            "            default: return 16'd0;",
+            "        endcase",
+            "    endfunction",
+            "",
+        ]
+    lines[-1] = "endpackage"
+    return "\n".join(lines) + "\n"
+
+
+def _tuple(name, values):
+    rows = [
+        "    " + ", ".join(str(v) for v in values[i : i + 16]) + ","
+        for i in range(0, len(values), 16)
+    ]
+    return [f"{name} = ("] + rows + [")"]
+
+
+def render_py(tables, stamp):
+    lines = [
+        "# Generated by scripts/gen_ntt_rom.py. Do not edit.",
+        f"# inputs: {stamp}",
+        '"""',
+        "Frozen NTT twiddle tables, the same values as ``ntt_rom_pkg.sv``.",
+        "",
+        "Tuples for the scalar reference models, read-only NumPy arrays with",
+        "an ``_NP`` suffix for the vectorised ones.",
+        '"""',
+        "",
+        "import numpy as np",
+        "",
+        f"Q = {Q}",
+        f"N = {N}",
+        f"ROOT_OF_UNITY = {ROOT_OF_UNITY}",
+        f"QINV = {QINV}",
+        f"MONT_R = {MONT_R}",
+        f"MONT_R2 = {MONT_R2}",
+        f"INV_N = {tables['INV_N']}",
+        f"INV_N_MONT = {tables['INV_N_MONT']}",
+        "",
+        "# fmt: off",
+    ]
+    names = ["ZETAS", "ZETAS_MONT", "ZETAS_INV_MONT", "GAMMAS"]
+    for name in names:
+        lines += _tuple(name, tables[name])
+    lines += [
+        "# fmt: on",
+        "",
+        "",
+        "def _frozen(values):",
+        "    array = np.array(values, np.int64)",
+        "    array.flags.writeable = False",
+        "    return array",
+        "",
+        "",
+    ]
+    lines += [f"{name}_NP = _frozen({name})" for name in names]
+    return "\n".join(lines) + "\n"
+
+
+def stamp_of(path):
+    if not path.exists():
+        return None
+    with open(path) as f:
+        for line in f:
+            match = re.search(r"inputs: ([0-9a-f]+)", line)
+            if match:
+                return match.group(1)
+    return None
+
+
+def inlined_table(source, name):
+    start = source.index(f"function automatic logic [15:0] {name}(")
+    body = source[start : source.index("endfunction", start)]
+    return [int(v) for v in re.findall(r"7'd\d+:\s*return 16'd(\d+);", body)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="Rewrite up-to-date files")
+    parser.add_argument(
+        "--check", action="store_true", help="Only report stale files, exit 1 if any"
+    )
+    args = parser.parse_args()
+
+    stamp = fingerprint()
+    tables = compute_tables()
+    outputs = [(SV_PATH, render_sv), (PY_PATH, render_py)]
+
+    stale = 0
+    for path, render in outputs:
+        relative = path.relative_to(ROOT_DIR)
+        if stamp_of(path) == stamp and not args.force:
+            print(f"{relative} is up to date")
+            continue
+        if args.check:
+            print(f"{relative} is stale")
+            stale += 1
+            continue
+        path.write_text(render(tables, stamp))
+        print(f"Wrote {relative}")
+
+    if args.check:
+        source = NTT_CORE_PATH.read_text()
+        for name, key in [
+            ("get_zeta", "ZETAS_MONT"),
+            ("get_zeta_inv", "ZETAS_INV_MONT"),
+        ]:
+            if inlined_table(source, name) != tables[key]:
+                print(f"{NTT_CORE_PATH.relative_to(ROOT_DIR)}: {name} differs")
+                stale += 1
+        sys.exit(1 if stale else 0)
 
 
 if __name__ == "__main__":
-    gen_rom()
+    main()
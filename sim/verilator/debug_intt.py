@@ -1,85 +1,20 @@
-Q = 3329
-ROOT_OF_UNITY = 17
-
-
-def bit_reverse(n, bits):
-    result = 0
-    for _ in range(bits):
-        result = (result << 1) | (n & 1)
-        n >>= 1
-    return result
-
-
-def hw_mul(a, b):
-    if a > 32767:
-        a -= 65536
-    if b > 32767:
-        b -= 65536
-    prod = a * b
-    m = (prod * -3327) & 0xFFFF
-    if m > 32767:
-        m -= 65536
-    mq = m * Q
-    t = (prod - mq) >> 16
-    if t >= Q:
-        t -= Q
-    elif t < 0:
-        t += Q
-    return t & 0xFFFF
-
-
-def hw_add_sub(a, b, t):
-    raw_sum = a + t
-    if raw_sum >= Q:
-        sum_val = raw_sum - Q
-    else:
-        sum_val = raw_sum
-    if a >= t:
-        diff_val = a - t
-    else:
-        diff_val = (a + Q) - t
-    return sum_val, diff_val
-
-
-def mod_inverse(a):
-    m = Q
-    y = 0
-    x = 1
-    if m == 1:
-        return 0
-    while a > 1:
-        q_div = a // m
-        t = m
-        m = a % m
-        a = t
-        t = y
-        y = x - q_div * y
-        x = t
-    if x < 0:
-        x += Q
-    return x
+import sys
+from pathlib import Path
+
+# Shared with the Python models
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "kyber_py"))
+from modarith import Q, hw_add_sub, hw_mul
+from ntt_tables import INV_N_MONT, ZETAS_INV_MONT, ZETAS_MONT
 
 
 def debug_run():
-    print("Generating Zetas...")
-    zetas = [0] * 128
-    val = 1
-    mont_r = (1 << 16) % Q
-    for i in range(128):
-        zetas[bit_reverse(i, 7)] = (val * mont_r) % Q
-        val = (val * ROOT_OF_UNITY) % Q
+    # Tables come from scripts/gen_ntt_rom.py
+    zetas = ZETAS_MONT
+    zetas_inv_table = ZETAS_INV_MONT
 
     print(f"Zetas[0] (should be unused/Mont(1)): {zetas[0]}")
     print(f"Zetas[1] (Mont(root^64)): {zetas[1]}")
 
-    # Inverse Zetas
-    zetas_inv_table = []
-    r2 = (mont_r * mont_r) % Q
-    for z in zetas:
-        inv = mod_inverse(z)
-        target = (inv * r2) % Q
-        zetas_inv_table.append(target)
-
     print(f"InvZeta[1]: {zetas_inv_table[1]}")
 
     check = hw_mul(zetas[1], zetas_inv_table[1])
@@ -103,7 +38,7 @@ def debug_run():
             for j in range(start, start + length):
                 t = hw_mul(res[j + length], zeta)
                 u = res[j]
-                res[j], res[j + length] = hw_add_sub(u, res[j + length], t)
+                res[j], res[j + length] = hw_add_sub(u, t)
             start += 2 * length
         length //= 2
 
@@ -127,20 +62,18 @@ def debug_run():
 
             for j in range(start, start + length):
                 # Gentleman-Sande
-                # sum, diff = hw_add_sub(U, 0, V)
+                # sum, diff = hw_add_sub(U, V)
                 # U' = sum
                 # V' = diff * zeta
-                sum_val, diff_val = hw_add_sub(res[j], 0, res[j + length])
+                sum_val, diff_val = hw_add_sub(res[j], res[j + length])
                 res[j] = sum_val
                 res[j + length] = hw_mul(diff_val, zeta)
             start += 2 * length
         length *= 2
 
     # Scale
-    inv_128 = mod_inverse(128)
-    inv_128_mont = (inv_128 * mont_r) % Q
     for i in range(256):
-        res[i] = hw_mul(res[i], inv_128_mont)
+        res[i] = hw_mul(res[i], INV_N_MONT)
 
     mismatches = 0
     for i in range(256):
@@ -151,15 +84,6 @@ def debug_run():
 
     if mismatches == 0:
         print("SUCCESS: Random Poly Inverted Correctly")
-        # Dump Verilog
-        print("// Inverse Zetas")
-        print("function automatic logic [15:0] get_zeta_inv(input logic [6:0] idx);")
-        print("    case (idx)")
-        for i, val in enumerate(zetas_inv_table):
-            print(f"        7'd{i}: return 16'd{val};")
-        print("        default: return 16'd0;")
-        print("    endcase")
-        print("endfunction")
     else:
         print(f"FAILURE: {mismatches} mismatches")
 
@@ -3,6 +3,15 @@ import ctypes
 import sys
 import time
 import random
+from pathlib import Path
+
+import numpy as np
+
+# Golden model arithmetic, bit-exact to ntt_mul and modular_add_sub, and
+# the twiddle tables generated by scripts/gen_ntt_rom.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "kyber_py"))
+from modarith import Q, hw_add_sub, hw_mul
+from ntt_tables import INV_N_MONT, ZETAS_INV_MONT_NP, ZETAS_MONT_NP
 
 # Load the shared library
 lib_path = os.path.abspath("obj_dir/libkyber_sim.so")
@@ -32,139 +41,37 @@ sim.sim_read.restype = ctypes.c_int
 sim.sim_close.argtypes = []
 sim.sim_close.restype = None
 
-# Kyber Constants
-Q = 3329
-ROOT_OF_UNITY = 17
-
-
-def bit_reverse(n, bits):
-    result = 0
-    for _ in range(bits):
-        result = (result << 1) | (n & 1)
-        n >>= 1
-    return result
-
-
-def hw_mul(a, b):  # inputs signed 16-bit
-    if a > 32767:
-        a -= 65536
-    if b > 32767:
-        b -= 65536
-
-    prod = a * b
-    m = (prod * -3327) & 0xFFFF
-    if m > 32767:
-        m -= 65536
-
-    mq = m * Q
-    t = (prod - mq) >> 16
-
-    if t >= Q:
-        t -= Q
-    elif t < 0:
-        t += Q
-
-    return t & 0xFFFF
-
-
-def hw_add_sub(a, b, t):
-    raw_sum = a + t
-    if raw_sum >= Q:
-        sum_val = raw_sum - Q
-    else:
-        sum_val = raw_sum
-    if a >= t:
-        diff_val = a - t
-    else:
-        diff_val = (a + Q) - t
-    return sum_val, diff_val
-
-
-def mod_inverse(a):
-    m = Q
-    y = 0
-    x = 1
-    if m == 1:
-        return 0
-    while a > 1:
-        q_div = a // m
-        t = m
-        m = a % m
-        a = t
-        t = y
-        y = x - q_div * y
-        x = t
-    if x < 0:
-        x += Q
-    return x
-
 
 def reference_ntt(poly):
-    zetas = [0] * 128
-    val = 1
-    mont_r = (1 << 16) % Q
-    for i in range(128):
-        zetas[bit_reverse(i, 7)] = (val * mont_r) % Q
-        val = (val * ROOT_OF_UNITY) % Q
-
-    res = list(poly)
+    # One layer at a time: the models work on whole arrays, and each
+    # butterfly group k = 1..127 takes its own twiddle
+    res = np.array(poly, np.int64)
     k = 1
     length = 128
     while length >= 2:
-        start = 0
-        while start < 256:
-            zeta = zetas[k]
-            k += 1
-            for j in range(start, start + length):
-                t = hw_mul(res[j + length], zeta)
-                u = res[j]
-                res[j], res[j + length] = hw_add_sub(u, res[j + length], t)
-            start += 2 * length
+        groups = 128 // length
+        res = res.reshape(groups, 2, length)
+        t = hw_mul(res[:, 1], ZETAS_MONT_NP[k : k + groups, None])
+        res[:, 0], res[:, 1] = hw_add_sub(res[:, 0], t)
+        k += groups
         length //= 2
-    return res
+    return res.reshape(256).tolist()
 
 
 def reference_inv_ntt(poly):
-    # Corrected INTT Logic
-    zetas = [0] * 128
-    val = 1
-    mont_r = (1 << 16) % Q
-    for i in range(128):
-        zetas[bit_reverse(i, 7)] = (val * mont_r) % Q
-        val = (val * ROOT_OF_UNITY) % Q
-
-    zetas_inv_table = []
-    r2 = (mont_r * mont_r) % Q
-    for z in zetas:
-        inv = mod_inverse(z)
-        target = (inv * r2) % Q
-        zetas_inv_table.append(target)
-
-    res = list(poly)
+    res = np.array(poly, np.int64)
     # Loop len 2..128
     length = 2
     while length <= 128:
-        start = 0
-        k = 128 // length  # Corrected starting K
-
-        while start < 256:
-            zeta = zetas_inv_table[k]
-            k += 1
-
-            for j in range(start, start + length):
-                sum_val, diff_val = hw_add_sub(res[j], 0, res[j + length])
-                res[j] = sum_val
-                res[j + length] = hw_mul(diff_val, zeta)
-            start += 2 * length
+        groups = 128 // length  # Corrected starting K
+        res = res.reshape(groups, 2, length)
+        sum_val, diff_val = hw_add_sub(res[:, 0], res[:, 1])
+        res[:, 0] = sum_val
+        res[:, 1] = hw_mul(diff_val, ZETAS_INV_MONT_NP[groups : 2 * groups, None])
         length *= 2
 
     # Scale
-    inv_128 = mod_inverse(128)
-    inv_128_mont = (inv_128 * mont_r) % Q
-    for i in range(256):
-        res[i] = hw_mul(res[i], inv_128_mont)
-
-    return res
+    return hw_mul(res.reshape(256), INV_N_MONT).tolist()
 
 
 def test_inv_ntt_ref():